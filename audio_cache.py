@@ -0,0 +1,137 @@
+import os
+import re
+import uuid
+import threading
+import metrics
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    # Not available on Windows; fall back to in-process locking only
+    fcntl = None
+
+# Compressed speech audio, one file per video: audio_cache/<platform>_<video_id>.<ext>
+CACHE_DIR = os.getenv("AUDIO_CACHE_DIR", "audio_cache")
+# Total size of cached audio before least recently used files are evicted
+MAX_BYTES = int(os.getenv("AUDIO_CACHE_MAX_BYTES", 2 * 1024 * 1024 * 1024))
+
+AUDIO_EXTENSIONS = (".mp3", ".ogg", ".m4a", ".webm", ".opus")
+
+_thread_locks = {}
+_thread_locks_guard = threading.Lock()
+
+def _key(platform, video_id):
+    return re.sub(r'[^\w\-]', '_', f"{platform}_{video_id}")
+
+def _thread_lock(key):
+    with _thread_locks_guard:
+        return _thread_locks.setdefault(key, threading.Lock())
+
+@contextmanager
+def lock(platform, video_id):
+    """
+    Exclusive lock for one video's cache entry, across threads and processes.
+    Hold it while filling or using the entry; eviction skips locked entries.
+    """
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    key = _key(platform, video_id)
+    with _thread_lock(key):
+        if fcntl is None:
+            yield
+            return
+        with open(os.path.join(CACHE_DIR, key + ".lock"), "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def _is_locked(key):
+    """
+    True if another worker currently holds the lock of an entry.
+    """
+    if fcntl is None:
+        return _thread_lock(key).locked()
+    try:
+        with open(os.path.join(CACHE_DIR, key + ".lock"), "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+            return False
+    except OSError:
+        return True
+
+def get_audio(platform, video_id):
+    """
+    Returns the path of the cached audio of a video, or None.
+    Call while holding lock(platform, video_id).
+    """
+    key = _key(platform, video_id)
+    for ext in AUDIO_EXTENSIONS:
+        path = os.path.join(CACHE_DIR, key + ext)
+        if os.path.exists(path):
+            # mtime doubles as the last access time for LRU eviction
+            os.utime(path)
+            print(f"Audio cache hit: {path}")
+            metrics.incr("cache_hits", cache="audio")
+            return path
+    metrics.incr("cache_misses", cache="audio")
+    return None
+
+def temp_path(platform=None, video_id=None):
+    """
+    A unique path prefix (no extension) inside the cache dir for downloads,
+    so the finished file can be moved in with an atomic rename.
+    """
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    name = _key(platform, video_id) if video_id else "audio"
+    return os.path.join(CACHE_DIR, f".tmp_{name}_{uuid.uuid4().hex[:12]}")
+
+def store_audio(platform, video_id, src_path):
+    """
+    Moves src_path into the cache and evicts old entries if over budget.
+    Call while holding lock(platform, video_id). Returns the cached path.
+    """
+    key = _key(platform, video_id)
+    ext = os.path.splitext(src_path)[1] or ".mp3"
+    path = os.path.join(CACHE_DIR, key + ext)
+    os.replace(src_path, path)
+    evict(keep=key)
+    return path
+
+def evict(max_bytes=None, keep=None):
+    """
+    Deletes least recently used audio until the cache fits in max_bytes.
+    Entries that are locked (in use) or named `keep` are skipped.
+    """
+    max_bytes = MAX_BYTES if max_bytes is None else max_bytes
+    if not os.path.isdir(CACHE_DIR):
+        return
+
+    files = []
+    for name in os.listdir(CACHE_DIR):
+        base, ext = os.path.splitext(name)
+        if ext not in AUDIO_EXTENSIONS or name.startswith(".tmp_"):
+            continue
+        path = os.path.join(CACHE_DIR, name)
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        files.append((st.st_mtime, st.st_size, base, path))
+
+    total = sum(f[1] for f in files)
+    if total <= max_bytes:
+        return
+
+    for mtime, size, key, path in sorted(files):
+        if total <= max_bytes:
+            break
+        if key == keep or _is_locked(key):
+            continue
+        try:
+            os.remove(path)
+            total -= size
+            print(f"Evicted {path} from audio cache.")
+        except OSError:
+            pass
@@ -1,7 +1,93 @@
 import os
-import yt_dlp
-from openai import OpenAI
-import time
+import re
+import math
+import bisect
+import shutil
+import difflib
+import sys
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+import transcript_cache
+import audio_cache
+import metrics
+import ratelimit
+from clients import get_openai_client
+from extractors import get_video_key
+from transcript import Transcript
+
+# Stream audio from yt-dlp straight into ffmpeg instead of downloading the
+# full file first. Set AUDIO_STREAMING=0 to always use download_audio.
+AUDIO_STREAMING = os.getenv("AUDIO_STREAMING", "1") != "0"
+# Codec of the streamed speech audio: "mp3" or "opus"
+AUDIO_STREAM_CODEC = os.getenv("AUDIO_STREAM_CODEC", "mp3")
+# Lowest-bitrate audio-only format that is still fine for speech
+SPEECH_FORMAT = "worstaudio[abr>=32]/worstaudio/bestaudio/best"
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+
+_CODEC_ARGS = {
+    "mp3": (["-c:a", "libmp3lame", "-b:a", "32k"], "mp3"),
+    "opus": (["-c:a", "libopus", "-b:a", "24k", "-application", "voip"], "ogg"),
+}
+
+def stream_audio(url, output_filename="temp_audio"):
+    """
+    Pipes the smallest usable audio stream from yt-dlp through ffmpeg into
+    16 kHz mono speech audio. Nothing but the small transcoded file touches the disk.
+    Returns the output path, or None on failure.
+    """
+    codec_args, ext = _CODEC_ARGS.get(AUDIO_STREAM_CODEC, _CODEC_ARGS["mp3"])
+    output_path = f"{output_filename}.{ext}"
+    part_path = f"{output_filename}.part.{ext}"
+    referer = 'https://www.bilibili.com/' if 'bilibili.com' in url else 'https://www.youtube.com/'
+
+    download_cmd = [
+        sys.executable, "-m", "yt_dlp",
+        "-f", SPEECH_FORMAT,
+        "-o", "-",
+        "--quiet", "--no-warnings", "--no-part",
+        "--user-agent", USER_AGENT,
+        "--referer", referer,
+    ]
+    if os.path.exists('cookies.txt'):
+        download_cmd += ["--cookies", "cookies.txt"]
+    download_cmd.append(url)
+
+    # ffmpeg -i pipe:0 -vn -ac 1 -ar 16000 <codec> output
+    transcode_cmd = [
+        "ffmpeg", "-y", "-loglevel", "error",
+        "-i", "pipe:0",
+        "-vn", "-ac", "1", "-ar", "16000",
+        *codec_args,
+        part_path
+    ]
+
+    try:
+        downloader = subprocess.Popen(download_cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        try:
+            transcoder = subprocess.Popen(transcode_cmd, stdin=downloader.stdout, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        except Exception:
+            downloader.kill()
+            raise
+        # Only ffmpeg reads the pipe now; yt-dlp gets SIGPIPE if ffmpeg exits early
+        downloader.stdout.close()
+        _, ffmpeg_err = transcoder.communicate()
+        downloader.wait()
+
+        if downloader.returncode != 0 or transcoder.returncode != 0:
+            print(f"Streaming audio failed (yt-dlp: {downloader.returncode}, ffmpeg: {transcoder.returncode}). {ffmpeg_err.decode(errors='ignore')[:200]}")
+            return None
+
+        os.replace(part_path, output_path)
+        metrics.incr("bytes_downloaded", os.path.getsize(output_path), source="audio_stream")
+        print(f"Streamed audio: {os.path.getsize(output_path) / (1024*1024):.2f} MB")
+        return output_path
+    except Exception as e:
+        print(f"Error streaming audio: {e}")
+        return None
+    finally:
+        if os.path.exists(part_path):
+            os.remove(part_path)
 
 def download_audio(url, output_filename="temp_audio"):
     """
@@ -13,7 +99,7 @@ def download_audio(url, output_filename="temp_audio"):
         'outtmpl': f"{output_filename}.%(ext)s",
         'quiet': True,
         'no_warnings': True,
-        'user_agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+        'user_agent': USER_AGENT,
         'referer': 'https://www.youtube.com/',
     }
     
@@ -21,12 +107,14 @@ def download_audio(url, output_filename="temp_audio"):
         ydl_opts['cookiefile'] = 'cookies.txt'
 
     try:
+        import yt_dlp
         with yt_dlp.YoutubeDL(ydl_opts) as ydl:
             info = ydl.extract_info(url, download=True)
             ext = info.get('ext', 'm4a')
             downloaded_path = f"{output_filename}.{ext}"
             
             if os.path.exists(downloaded_path):
+                metrics.incr("bytes_downloaded", os.path.getsize(downloaded_path), source="audio_download")
                 return downloaded_path
             
             # fallback: look for any file starting with output_filename
@@ -74,96 +162,448 @@ def download_audio_pytubefix(url, output_filename):
         print(f"Error downloading with pytubefix: {e}")
         return None
 
-def transcribe_audio(file_path):
+# OpenAI Limit is 25MB (26214400 bytes). We use 24MB as safety threshold.
+LIMIT_BYTES = 24 * 1024 * 1024
+# Seconds shared by neighbouring segments, so no words are cut at a boundary
+SEGMENT_OVERLAP_SECONDS = float(os.getenv("WHISPER_OVERLAP_SECONDS", 5))
+# Number of segments sent to Whisper at the same time
+WHISPER_WORKERS = int(os.getenv("WHISPER_WORKERS", 4))
+
+# Optional pre-pass before Whisper: cut silences (intros, music beds, long
+# pauses) with AUDIO_TRIM_SILENCE=1 and speed speech up with AUDIO_TEMPO=1.25.
+# Transcript timings are mapped back to the original audio afterwards.
+TRIM_SILENCE = os.getenv("AUDIO_TRIM_SILENCE", "0") != "0"
+# Quieter than this (dBFS) for at least MIN_SILENCE_SECONDS counts as silence
+SILENCE_DB = float(os.getenv("AUDIO_SILENCE_DB", -35))
+MIN_SILENCE_SECONDS = float(os.getenv("AUDIO_MIN_SILENCE_SECONDS", 1.0))
+# Seconds of every cut silence kept on both sides, so words are not clipped
+SILENCE_PADDING = 0.25
+# Whisper gets less accurate on faster speech, so the speed-up is capped
+MAX_TEMPO = 1.5
+AUDIO_TEMPO = min(MAX_TEMPO, max(1.0, float(os.getenv("AUDIO_TEMPO", 1.0))))
+
+_SILENCE_START_RE = re.compile(r'silence_start: (-?[\d.]+)')
+_SILENCE_END_RE = re.compile(r'silence_end: (-?[\d.]+)')
+
+def get_audio_duration(file_path):
+    """
+    Returns the duration of an audio file in seconds (via ffprobe).
+    """
+    cmd = [
+        "ffprobe", "-v", "error",
+        "-show_entries", "format=duration",
+        "-of", "default=noprint_wrappers=1:nokey=1",
+        file_path
+    ]
+    result = subprocess.run(cmd, check=True, capture_output=True, text=True)
+    return float(result.stdout.strip())
+
+def split_audio(file_path, limit_bytes=LIMIT_BYTES, overlap_seconds=SEGMENT_OVERLAP_SECONDS):
+    """
+    Splits an audio file into overlapping time segments that each stay under limit_bytes.
+    Returns (segment path, start seconds) pairs in order.
+    """
+    duration = get_audio_duration(file_path)
+    bytes_per_second = os.path.getsize(file_path) / duration
+    # Keep 10% headroom, bitrates are not perfectly constant
+    segment_seconds = int(limit_bytes * 0.9 / bytes_per_second) - overlap_seconds
+    if segment_seconds <= 0:
+        raise ValueError("Audio bitrate too high to split into segments under the size limit.")
+
+    segment_count = math.ceil(duration / segment_seconds)
+    print(f"Splitting {duration/60:.1f} min of audio into {segment_count} segments...")
+
+    segment_dir = file_path + "_segments"
+    os.makedirs(segment_dir, exist_ok=True)
+    ext = os.path.splitext(file_path)[1] or ".mp3"
+
+    paths = []
+    for i in range(segment_count):
+        start = i * segment_seconds
+        segment_path = os.path.join(segment_dir, f"segment_{i:03d}{ext}")
+        # ffmpeg -ss start -t length -i input -c copy segment
+        cmd = [
+            "ffmpeg", "-y",
+            "-ss", str(start),
+            "-t", str(segment_seconds + overlap_seconds),
+            "-i", file_path,
+            "-map", "0:a:0",
+            "-c", "copy",
+            segment_path
+        ]
+        subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        paths.append((segment_path, start))
+    return paths
+
+def detect_speech(file_path, duration):
+    """
+    Returns the (start, end) time ranges of an audio file that are not
+    silence, found with ffmpeg's silencedetect filter.
+    """
+    cmd = [
+        "ffmpeg", "-hide_banner", "-nostats",
+        "-i", file_path,
+        "-map", "0:a:0",
+        "-af", f"silencedetect=noise={SILENCE_DB}dB:d={MIN_SILENCE_SECONDS}",
+        "-f", "null", "-"
+    ]
+    result = subprocess.run(cmd, check=True, capture_output=True, text=True, errors="ignore")
+    starts = [float(x) for x in _SILENCE_START_RE.findall(result.stderr)]
+    ends = [float(x) for x in _SILENCE_END_RE.findall(result.stderr)]
+
+    speech = []
+    position = 0.0
+    for i, start in enumerate(starts):
+        # Silence running to the end of the file has no silence_end line
+        end = ends[i] if i < len(ends) else duration
+        cut_start = start + SILENCE_PADDING if start > 0 else 0.0
+        cut_end = end - SILENCE_PADDING if end < duration else duration
+        if cut_end <= cut_start:
+            continue
+        if cut_start > position:
+            speech.append((position, cut_start))
+        position = cut_end
+    if position < duration:
+        speech.append((position, duration))
+    return speech
+
+def _speech_filter(speech, tempo):
+    """
+    ffmpeg audio filter keeping only the speech ranges (None: everything) at tempo.
+    """
+    filters = []
+    if speech is not None:
+        select = "+".join(f"between(t,{start:.3f},{end:.3f})" for start, end in speech)
+        filters.append(f"aselect='{select}'")
+        filters.append("asetpts=N/SR/TB")
+    if tempo != 1.0:
+        filters.append(f"atempo={tempo:g}")
+    return ",".join(filters)
+
+def prepare_speech(file_path):
+    """
+    Runs the optional pre-pass (TRIM_SILENCE, AUDIO_TEMPO) and reports the
+    original and processed durations. The result is re-encoded like
+    compress_audio. Returns (path, speech ranges or None, tempo) for
+    restore_times, or None if the pre-pass is off, would not help or failed.
+    """
+    if not TRIM_SILENCE and AUDIO_TEMPO == 1.0:
+        return None
+
+    processed_path = _work_path(file_path, "_speech.mp3")
+    try:
+        with metrics.timer("audio_prepass"):
+            duration = get_audio_duration(file_path)
+            speech = detect_speech(file_path, duration) if TRIM_SILENCE else None
+            if speech is not None:
+                kept = sum(end - start for start, end in speech)
+                if not speech or (kept > duration - 1.0 and AUDIO_TEMPO == 1.0):
+                    print("Speech pre-pass: no silence to cut.")
+                    return None
+
+            cmd = [
+                "ffmpeg", "-y", "-loglevel", "error",
+                "-i", file_path,
+                "-map", "0:a:0",
+                "-af", _speech_filter(speech, AUDIO_TEMPO),
+                "-ac", "1", "-ar", "16000", "-b:a", "32k",
+                processed_path
+            ]
+            subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            processed = get_audio_duration(processed_path)
+    except Exception as e:
+        print(f"Speech pre-pass failed: {e}. Sending the audio unchanged.")
+        if os.path.exists(processed_path):
+            os.remove(processed_path)
+        return None
+
+    metrics.incr("audio_seconds", round(duration, 1), phase="original")
+    metrics.incr("audio_seconds", round(processed, 1), phase="processed")
+    print(f"Speech pre-pass: {duration / 60:.1f} min -> {processed / 60:.1f} min of audio "
+          f"({1 - processed / duration:.0%} shorter, {len(speech) if speech is not None else 1} speech ranges, tempo {AUDIO_TEMPO:g})")
+    return processed_path, speech, AUDIO_TEMPO
+
+def restore_times(transcript, speech, tempo):
+    """
+    Maps the timings of a transcript of prepare_speech's output back onto
+    the original audio.
+    """
+    if not transcript or not transcript.timed:
+        return transcript
+    if speech is None:
+        return transcript.map_times(lambda t: t * tempo)
+
+    # Where every speech range starts in the trimmed audio (before the tempo change)
+    offsets = []
+    position = 0.0
+    for start, end in speech:
+        offsets.append(position)
+        position += end - start
+
+    def original(t):
+        t *= tempo
+        i = max(0, bisect.bisect_right(offsets, t) - 1)
+        return speech[i][0] + t - offsets[i]
+
+    return transcript.map_times(original)
+
+def _tokenize(text):
+    """
+    Splits text into (normalized token, start, end). CJK characters are single tokens.
+    """
+    tokens = []
+    for m in re.finditer(r'[\u4e00-\u9fff]|[^\s\u4e00-\u9fff]+', text):
+        word = re.sub(r'[^\w]', '', m.group()).lower()
+        if word:
+            tokens.append((word, m.start(), m.end()))
+    return tokens
+
+def merge_overlapping_texts(texts, window=80, min_match=4):
+    """
+    Joins transcripts of overlapping segments in order, dropping the text that
+    was transcribed twice at each boundary.
+    """
+    merged = ""
+    for text in texts:
+        text = (text or "").strip()
+        if not text:
+            continue
+        if not merged:
+            merged = text
+            continue
+
+        prev_tokens = _tokenize(merged)[-window:]
+        next_tokens = _tokenize(text)[:window]
+        matcher = difflib.SequenceMatcher(
+            None,
+            [t[0] for t in prev_tokens],
+            [t[0] for t in next_tokens],
+            autojunk=False
+        )
+        match = matcher.find_longest_match(0, len(prev_tokens), 0, len(next_tokens))
+
+        if match.size >= min_match:
+            # Keep the earlier segment up to the shared words, continue with the later one from there
+            cut_prev = prev_tokens[match.a][1]
+            cut_next = next_tokens[match.b][1]
+            merged = merged[:cut_prev] + text[cut_next:]
+        else:
+            merged = merged + " " + text
+    return merged
+
+def _transcribe_file(client, path):
+    """
+    Transcribes one audio file. Returns a Transcript with Whisper's segment timings.
+    """
+    def create():
+        metrics.incr("bytes_uploaded", os.path.getsize(path), api="whisper")
+        # Reopened per attempt, a retry must upload the file from the start
+        with metrics.timer("whisper"), open(path, "rb") as audio_file:
+            return client.audio.transcriptions.create(
+                model="whisper-1", 
+                file=audio_file,
+                response_format="verbose_json"
+            )
+
+    response = ratelimit.call("openai", create)
+    segments = getattr(response, "segments", None)
+    if not segments:
+        return Transcript.from_text(response.text)
+    return Transcript.from_segments((s.start, s.end, s.text) for s in segments)
+
+def merge_segment_transcripts(parts, overlap_seconds=SEGMENT_OVERLAP_SECONDS):
+    """
+    Joins the transcripts of overlapping audio segments, given as
+    (transcript, segment start seconds) pairs in order.
+    Timed transcripts are cut in the middle of each overlap, so every Whisper
+    segment is kept exactly once; untimed ones fall back to text matching.
+    """
+    if not all(t.timed for t, _ in parts):
+        return Transcript.from_text(merge_overlapping_texts([t.text for t, _ in parts]))
+
+    pieces = []
+    for i, (part, start) in enumerate(parts):
+        part = part.shift(start)
+        # Segment i+1 starts overlap_seconds before segment i ends
+        cut_before = start + overlap_seconds / 2 if i > 0 else None
+        cut_after = parts[i + 1][1] + overlap_seconds / 2 if i + 1 < len(parts) else None
+        pieces.append(part.between(cut_before, cut_after))
+    return Transcript.concat(pieces)
+
+def transcribe_segments(client, file_path):
+    """
+    Splits a large audio file, transcribes the segments concurrently and stitches
+    the transcripts on their time ranges.
+    """
+    segment_dir = file_path + "_segments"
+    try:
+        segments = split_audio(file_path)
+        with ThreadPoolExecutor(max_workers=WHISPER_WORKERS) as pool:
+            transcripts = list(pool.map(lambda segment: _transcribe_file(client, segment[0]), segments))
+        return merge_segment_transcripts([(t, start) for t, (_, start) in zip(transcripts, segments)])
+    finally:
+        shutil.rmtree(segment_dir, ignore_errors=True)
+
+def _work_path(file_path, suffix):
+    """
+    Path for an intermediate file derived from file_path. Named .tmp_* so
+    audio cache eviction never takes it for a cache entry (file_path may be
+    a cached file).
+    """
+    directory, name = os.path.split(os.path.splitext(file_path)[0])
+    if not name.startswith(".tmp_"):
+        name = ".tmp_" + name
+    return os.path.join(directory, name + suffix)
+
+def compress_audio(file_path):
+    """
+    Re-encodes audio as 32k mono mp3 (plenty for speech).
+    Returns the compressed path, or None if ffmpeg failed.
+    """
+    # Use ffmpeg to compress: mono, 32k bitrate mp3
+    # This reduces size significantly while keeping speech valid
+    compressed_path = _work_path(file_path, "_compressed.mp3")
+    
+    # ffmpeg -i input -map 0:a:0 -b:a 32k -ac 1 output.mp3
+    cmd = [
+        "ffmpeg", "-y", 
+        "-i", file_path, 
+        "-map", "0:a:0", 
+        "-b:a", "32k", 
+        "-ac", "1", 
+        compressed_path
+    ]
+    
+    try:
+        with metrics.timer("audio_compress"):
+            subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        new_size = os.path.getsize(compressed_path)
+        print(f"Compressed size: {new_size / (1024*1024):.2f} MB")
+        return compressed_path
+    except Exception as compress_err:
+        print(f"Compression failed: {compress_err}.")
+        if os.path.exists(compressed_path):
+            os.remove(compressed_path)
+        return None
+
+def transcribe_audio(file_path, keep_file=False):
     """
-    Transcribes the audio file using OpenAI Whisper.
+    Transcribes the audio file using OpenAI Whisper. Returns a Transcript, or None.
+    Files still over the upload limit after compression are transcribed in segments.
+    The file is deleted afterwards unless keep_file is True (e.g. cached audio).
     """
     api_key = os.getenv("OPENAI_API_KEY")
     if not api_key:
         raise ValueError("OPENAI_API_KEY not found.")
 
-    client = OpenAI(api_key=api_key)
+    client = get_openai_client(api_key)
 
     try:
-        file_size = os.path.getsize(file_path)
-        print(f"Audio file size: {file_size / (1024*1024):.2f} MB")
-        
-        # OpenAI Limit is 25MB (26214400 bytes). We use 24MB as safety threshold.
-        LIMIT_BYTES = 24 * 1024 * 1024
-        
         final_path = file_path
+        # Less audio to upload, transcribe and split
+        prepared = prepare_speech(file_path)
+        if prepared:
+            final_path = prepared[0]
+
+        file_size = os.path.getsize(final_path)
+        print(f"Audio file size: {file_size / (1024*1024):.2f} MB")
         
         if file_size > LIMIT_BYTES:
             print("File exceeds OpenAI 25MB limit. Compressing audio...")
-            # Use ffmpeg to compress: mono, 32k bitrate mp3
-            # This reduces size significantly while keeping speech valid
-            compressed_path = file_path + "_compressed.mp3"
-            
-            import subprocess
-            # ffmpeg -i input -map 0:a:0 -b:a 32k -ac 1 output.mp3
-            cmd = [
-                "ffmpeg", "-y", 
-                "-i", file_path, 
-                "-map", "0:a:0", 
-                "-b:a", "32k", 
-                "-ac", "1", 
-                compressed_path
-            ]
-            
-            try:
-                subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            compressed_path = compress_audio(final_path)
+            if compressed_path:
+                if final_path != file_path:
+                    os.remove(final_path)
                 final_path = compressed_path
-                new_size = os.path.getsize(final_path)
-                print(f"Compressed size: {new_size / (1024*1024):.2f} MB")
-                
-                if new_size > LIMIT_BYTES:
-                    print("Warning: Compressed file still > 24MB. splitting is required but not yet implemented. Proceeding (might fail)...")
-                    # Future: Implement chunking here
-            except Exception as compress_err:
-                print(f"Compression failed: {compress_err}. Trying original file.")
-                final_path = file_path
-
-        with open(final_path, "rb") as audio_file:
-            transcript = client.audio.transcriptions.create(
-                model="whisper-1", 
-                file=audio_file
-            )
-        
-        # Cleanup compressed if created
-        if final_path != file_path and os.path.exists(final_path):
-            os.remove(final_path)
-            
-        return transcript.text
+
+        try:
+            if os.path.getsize(final_path) > LIMIT_BYTES:
+                print("Audio still > 24MB. Transcribing in segments...")
+                transcript = transcribe_segments(client, final_path)
+            else:
+                transcript = _transcribe_file(client, final_path)
+        finally:
+            # Cleanup pre-pass/compressed file if created
+            if final_path != file_path and os.path.exists(final_path):
+                os.remove(final_path)
+
+        if prepared:
+            transcript = restore_times(transcript, prepared[1], prepared[2])
+        return transcript
     except Exception as e:
         print(f"Error during transcription: {e}")
         return None
     finally:
         # Cleanup original
-        try:
-            if os.path.exists(file_path):
-                os.remove(file_path)
-        except:
-            pass
+        if not keep_file:
+            try:
+                if os.path.exists(file_path):
+                    os.remove(file_path)
+            except:
+                pass
+
+def fetch_speech_audio(url, output_filename):
+    """
+    Gets compressed speech audio for url: streamed if possible, otherwise
+    downloaded and re-encoded. Returns the path, or None.
+    """
+    audio_path = None
+    if AUDIO_STREAMING:
+        with metrics.timer("audio_download", method="stream"):
+            audio_path = stream_audio(url, output_filename)
+        if audio_path:
+            return audio_path
+        print("Streaming failed. Falling back to full download...")
+
+    with metrics.timer("audio_download", method="download"):
+        audio_path = download_audio(url, output_filename)
+    if not audio_path:
+        return None
+
+    # Store speech-quality audio only, the full-quality download is not needed
+    compressed_path = compress_audio(audio_path)
+    if compressed_path:
+        os.remove(audio_path)
+        return compressed_path
+    return audio_path
 
 def process_video_audio(url):
     """
     Orchestrates downloading and transcribing.
+    Audio is kept in the audio cache (by platform + video id) for retries.
     """
+    platform, video_id = get_video_key(url)
+    cached = transcript_cache.get_transcript(platform, video_id, "whisper")
+    if cached:
+        return cached
+
     print("Fallback: Attempting to download and transcribe audio...")
-    
-    # Create cache dir
-    if not os.path.exists("audio_cache"):
-        os.makedirs("audio_cache")
-        
-    # Use a unique filename to avoid collisions/locks
-    # Save to audio_cache/
-    filename = f"audio_cache/audio_{int(time.time())}"
-    
-    audio_path = download_audio(url, filename)
-    if not audio_path:
-        print("Audio download failed.")
-        return None
-    
-    print(f"Audio downloaded to {audio_path}. Transcribing...")
-    text = transcribe_audio(audio_path)
-    return text
+
+    if not video_id:
+        # No stable key, use a throwaway file
+        audio_path = fetch_speech_audio(url, audio_cache.temp_path())
+        if not audio_path:
+            print("Audio download failed.")
+            return None
+        print(f"Audio downloaded to {audio_path}. Transcribing...")
+        return transcribe_audio(audio_path)
+
+    with audio_cache.lock(platform, video_id):
+        # Another worker may have finished this video while we waited for the lock
+        cached = transcript_cache.get_transcript(platform, video_id, "whisper")
+        if cached:
+            return cached
+
+        audio_path = audio_cache.get_audio(platform, video_id)
+        if not audio_path:
+            tmp_path = fetch_speech_audio(url, audio_cache.temp_path(platform, video_id))
+            if not tmp_path:
+                print("Audio download failed.")
+                return None
+            audio_path = audio_cache.store_audio(platform, video_id, tmp_path)
+            print(f"Audio downloaded to {audio_path}. Transcribing...")
+
+        text = transcribe_audio(audio_path, keep_file=True)
+        if text:
+            transcript_cache.put_transcript(platform, video_id, "whisper", text)
+        return text
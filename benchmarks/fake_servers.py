@@ -0,0 +1,232 @@
+"""
+Local stand-ins for the upstream APIs, for offline benchmarks.
+
+One threaded HTTP server answers:
+  OpenAI    POST /v1/chat/completions, POST /v1/audio/transcriptions
+  Notion    GET /notion/v1/databases/<id>, POST /notion/v1/databases/<id>/query,
+            POST /notion/v1/pages, PATCH /notion/v1/pages/<id>,
+            PATCH /notion/v1/blocks/<id>/children
+  Bilibili  GET /x/web-interface/view, GET /x/player/v2, GET /subtitle/<bvid>.json
+
+Latency and error rate are set per upstream ("openai", "notion", "bilibili").
+Errors are returned as 429 with a Retry-After header or as 500, half and half.
+"""
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+SUBTITLE_LINES = 400
+
+class FakeUpstreams:
+    def __init__(self, latency=None, error_rate=None, seed=0):
+        self.latency = {"openai": 0.0, "notion": 0.0, "bilibili": 0.0}
+        self.latency.update(latency or {})
+        self.error_rate = {"openai": 0.0, "notion": 0.0, "bilibili": 0.0}
+        self.error_rate.update(error_rate or {})
+        self.requests = {"openai": 0, "notion": 0, "bilibili": 0}
+        self.errors = {"openai": 0, "notion": 0, "bilibili": 0}
+        self.pages = []
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        upstreams = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                upstreams._handle(self, "GET")
+
+            def do_POST(self):
+                upstreams._handle(self, "POST")
+
+            def do_PATCH(self):
+                upstreams._handle(self, "PATCH")
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+
+    def env(self):
+        """
+        Environment variables that point the project at this server.
+        """
+        return {
+            "OPENAI_API_KEY": "sk-fake",
+            "OPENAI_BASE_URL": f"{self.base_url}/v1",
+            "NOTION_API_KEY": "fake",
+            "NOTION_DATABASE_ID": "fake-db",
+            "NOTION_API_BASE": f"{self.base_url}/notion/v1",
+            "BILIBILI_API_BASE": self.base_url,
+        }
+
+    def _upstream(self, path):
+        if path.startswith("/v1/"):
+            return "openai"
+        if path.startswith("/notion/"):
+            return "notion"
+        return "bilibili"
+
+    def _handle(self, handler, method):
+        parsed = urlparse(handler.path)
+        path = parsed.path
+        upstream = self._upstream(path)
+        length = int(handler.headers.get("Content-Length") or 0)
+        body = handler.rfile.read(length) if length else b""
+
+        with self._lock:
+            self.requests[upstream] += 1
+            fail = self._random.random() < self.error_rate[upstream]
+            retry_after = self._random.random() < 0.5
+            if fail:
+                self.errors[upstream] += 1
+
+        time.sleep(self.latency[upstream])
+
+        if fail:
+            if retry_after:
+                self._send(handler, 429, {"error": "rate limited"}, {"Retry-After": "0.1"})
+            else:
+                self._send(handler, 500, {"error": "upstream error"})
+            return
+
+        try:
+            status, payload, content_type = self._route(method, path, parse_qs(parsed.query), body)
+        except Exception as e:
+            status, payload, content_type = 400, {"error": str(e)}, None
+        self._send(handler, status, payload, content_type=content_type)
+
+    def _route(self, method, path, query, body):
+        if path == "/v1/chat/completions":
+            request = json.loads(body)
+            prompt = request["messages"][-1]["content"]
+            text = "模拟摘要：" + prompt[-200:].replace("\n", " ")
+            if request.get("stream"):
+                return 200, self._chat_stream(request["model"], text), "text/event-stream"
+            return 200, {
+                "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": request["model"],
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": text},
+                    "finish_reason": "stop"
+                }],
+                "usage": {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(text) // 4, "total_tokens": (len(prompt) + len(text)) // 4}
+            }, None
+
+        if path == "/v1/audio/transcriptions":
+            segments = [
+                {"id": i, "start": i * 4.0, "end": i * 4.0 + 4.0, "text": f" fake whisper segment {i}"}
+                for i in range(200)
+            ]
+            return 200, {
+                "task": "transcribe",
+                "language": "english",
+                "duration": 800.0,
+                "text": "".join(s["text"] for s in segments).strip(),
+                "segments": segments
+            }, None
+
+        if path.startswith("/notion/v1/databases/"):
+            if method == "GET":
+                return 200, {"object": "database", "properties": {"URL": {"id": "url_prop", "type": "url"}}}, None
+            request = json.loads(body or b"{}")
+            wanted = request.get("filter", {}).get("url", {}).get("equals")
+            with self._lock:
+                pages = [p for p in self.pages if wanted is None or p["properties"]["URL"]["url"] == wanted]
+            start = int(request.get("start_cursor") or 0)
+            size = request.get("page_size", 100)
+            batch = pages[start:start + size]
+            more = start + size < len(pages)
+            return 200, {
+                "object": "list",
+                "results": batch,
+                "has_more": more,
+                "next_cursor": str(start + size) if more else None
+            }, None
+
+        if path.startswith("/notion/v1/pages/"):
+            return 200, {"object": "page", "id": path.rsplit("/", 1)[-1], "archived": True}, None
+
+        if path == "/notion/v1/pages":
+            request = json.loads(body)
+            page = {
+                "object": "page",
+                "id": str(uuid.uuid4()),
+                "properties": {"URL": {"url": request["properties"]["URL"]["url"]}}
+            }
+            with self._lock:
+                self.pages.append(page)
+            return 200, page, None
+
+        if path.startswith("/notion/v1/blocks/"):
+            return 200, {"object": "list", "results": []}, None
+
+        if path == "/x/web-interface/view":
+            bvid = query["bvid"][0]
+            return 200, {"code": 0, "data": {"bvid": bvid, "cid": abs(hash(bvid)) % 10**8}}, None
+
+        if path == "/x/player/v2":
+            bvid = query["bvid"][0]
+            return 200, {"code": 0, "data": {"subtitle": {"subtitles": [
+                {"lan": "ai-zh", "url": f"{self.base_url}/subtitle/{bvid}.json"}
+            ]}}}, None
+
+        if path.startswith("/subtitle/"):
+            bvid = path.rsplit("/", 1)[-1].split(".")[0]
+            body_lines = [
+                {"from": i * 2.0, "to": i * 2.0 + 2.0, "content": f"{bvid} 第{i}句 今天的市场 英伟达 特斯拉 苹果 走势分析"}
+                for i in range(SUBTITLE_LINES)
+            ]
+            return 200, {"body": body_lines}, None
+
+        return 404, {"error": f"no route for {method} {path}"}, None
+
+    def _chat_stream(self, model, text):
+        events = []
+        for i in range(0, len(text), 8):
+            chunk = {
+                "id": "chatcmpl-stream",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "delta": {"content": text[i:i+8]}, "finish_reason": None}]
+            }
+            events.append(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n")
+        events.append("data: [DONE]\n\n")
+        return "".join(events)
+
+    def _send(self, handler, status, payload, headers=None, content_type=None):
+        if isinstance(payload, str):
+            data = payload.encode("utf-8")
+        else:
+            data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        handler.send_response(status)
+        handler.send_header("Content-Type", content_type or "application/json")
+        handler.send_header("Content-Length", str(len(data)))
+        for key, value in (headers or {}).items():
+            handler.send_header(key, value)
+        handler.end_headers()
+        handler.wfile.write(data)
@@ -0,0 +1,209 @@
+"""
+Offline throughput benchmark for the processing pipeline.
+
+Starts local fake OpenAI / Notion / Bilibili servers (benchmarks/fake_servers.py),
+points the project at them through environment variables and pushes N Bilibili
+videos through:
+  serial    one processor.process_video-style call per video, one after another
+  pipeline  processor.process_videos with all videos at once
+  monitor   monitor.check_new_videos with a stand-in channel listing of N videos
+
+Reports throughput, p50/p95 latency per stage and peak RSS.
+
+Usage:
+  python benchmarks/pipeline_bench.py [-n 20] [--scenario serial pipeline monitor]
+      [--openai-latency 0.5] [--notion-latency 0.1] [--bilibili-latency 0.05]
+      [--error-rate 0.0] [--real-rate-limits] [--json report.json]
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+import types
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from benchmarks.fake_servers import FakeUpstreams
+import metrics
+
+def percentile(values, p):
+    """
+    Nearest-rank percentile of values (p in 0-100). None for no values.
+    """
+    if not values:
+        return None
+    return metrics._percentile(sorted(values), p)
+
+def peak_rss_mb():
+    # ru_maxrss is KB on Linux, bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 1024 / (1024 if sys.platform == "darwin" else 1)
+
+def make_jobs(n, tag):
+    import processor
+
+    jobs = []
+    for i in range(n):
+        bvid = f"BV1{tag}{i:05d}"
+        jobs.append(processor.VideoJob(
+            url=f"https://www.bilibili.com/video/{bvid}",
+            platform="bilibili",
+            uploader_name="Bench",
+            title=f"Bench video {i}",
+            video_id=bvid
+        ))
+    return jobs
+
+def run_serial(n, tag):
+    import processor
+
+    jobs = make_jobs(n, tag)
+    for job in jobs:
+        processor.process_videos([job])
+    return jobs
+
+def run_pipeline(n, tag):
+    import processor
+
+    return processor.process_videos(make_jobs(n, tag))
+
+def run_monitor(n, tag):
+    import monitor
+    import processor
+
+    now = time.time()
+    videos = [
+        {"bvid": f"BV1{tag}{i:05d}", "title": f"Bench video {i}", "created": int(now - 60)}
+        for i in range(n)
+    ]
+
+    class StandInUser:
+        """
+        Replaces bilibili_api.user.User: a channel listing with `videos`.
+        """
+        def __init__(self, uid, credential=None):
+            self.uid = uid
+
+        async def get_user_info(self):
+            return {"name": "Bench"}
+
+        async def get_videos(self, ps=10):
+            return {"list": {"vlist": videos}}
+
+    try:
+        import bilibili_api
+    except ImportError:
+        bilibili_api = types.ModuleType("bilibili_api")
+        sys.modules["bilibili_api"] = bilibili_api
+    bilibili_api.user = types.SimpleNamespace(User=StandInUser)
+
+    async def check():
+        loop = asyncio.get_running_loop()
+        pipeline = processor.build_pipeline().start()
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            await monitor.check_new_videos(1, executor, pipeline)
+            return await loop.run_in_executor(executor, pipeline.close)
+
+    return asyncio.run(check())
+
+SCENARIOS = {
+    "serial": run_serial,
+    "pipeline": run_pipeline,
+    "monitor": run_monitor,
+}
+
+def summarize_run(name, jobs, elapsed):
+    stages = {}
+    for job in jobs:
+        for stage, seconds in job.timings.items():
+            stages.setdefault(stage, []).append(seconds)
+    done = sum(1 for job in jobs if job.status == "done")
+    return {
+        "scenario": name,
+        "videos": len(jobs),
+        "done": done,
+        "failed": sum(1 for job in jobs if job.status == "failed"),
+        "wall_seconds": round(elapsed, 3),
+        "throughput_per_min": round(done / elapsed * 60, 2) if elapsed else None,
+        "stages": {
+            stage: {
+                "p50": round(percentile(values, 50), 4),
+                "p95": round(percentile(values, 95), 4),
+                "count": len(values),
+            }
+            for stage, values in stages.items()
+        },
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }
+
+def print_report(report):
+    print(f"\n== {report['scenario']}: {report['done']}/{report['videos']} done, "
+          f"{report['failed']} failed in {report['wall_seconds']:.2f}s "
+          f"({report['throughput_per_min']} videos/min), peak RSS {report['peak_rss_mb']} MB")
+    print(f"   {'stage':<12}{'p50 (ms)':>10}{'p95 (ms)':>10}{'n':>6}")
+    for stage, stats in report["stages"].items():
+        print(f"   {stage:<12}{stats['p50'] * 1000:>10.1f}{stats['p95'] * 1000:>10.1f}{stats['count']:>6}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline pipeline benchmark")
+    parser.add_argument("-n", "--videos", type=int, default=20, help="Videos per scenario")
+    parser.add_argument("--scenario", nargs="+", choices=sorted(SCENARIOS), default=["serial", "pipeline", "monitor"])
+    parser.add_argument("--openai-latency", type=float, default=0.5, help="Seconds per OpenAI request")
+    parser.add_argument("--notion-latency", type=float, default=0.1, help="Seconds per Notion request")
+    parser.add_argument("--bilibili-latency", type=float, default=0.05, help="Seconds per Bilibili request")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with 429/500")
+    parser.add_argument("--real-rate-limits", action="store_true",
+                        help="Keep ratelimit's default per-upstream rates (by default they are lifted, "
+                             "the fake servers only throttle through --error-rate)")
+    parser.add_argument("--json", help="Also write the reports to this JSON file")
+    args = parser.parse_args()
+
+    upstreams = FakeUpstreams(
+        latency={"openai": args.openai_latency, "notion": args.notion_latency, "bilibili": args.bilibili_latency},
+        error_rate={name: args.error_rate for name in ("openai", "notion", "bilibili")},
+    ).start()
+
+    # Everything the run writes (DB, caches, output/) goes to a scratch dir
+    work_dir = tempfile.mkdtemp(prefix="pipeline_bench_")
+    os.environ.update(upstreams.env())
+    if not args.real_rate_limits:
+        for name in ("OPENAI", "NOTION", "BILIBILI"):
+            os.environ.setdefault(f"RATE_LIMIT_{name}", "1000")
+    os.environ["TRANSCRIPT_CACHE_DIR"] = os.path.join(work_dir, "transcript_cache")
+    os.environ["SUMMARY_CACHE_PATH"] = os.path.join(work_dir, "summary_cache.db")
+    os.environ["AUDIO_CACHE_DIR"] = os.path.join(work_dir, "audio_cache")
+    cwd = os.getcwd()
+    os.chdir(work_dir)
+
+    reports = []
+    try:
+        for name in args.scenario:
+            # Fresh video ids per scenario so nothing is served from cache or deduped
+            tag = uuid.uuid4().hex[:6]
+            metrics.reset()
+            start = time.perf_counter()
+            jobs = SCENARIOS[name](args.videos, tag)
+            report = summarize_run(name, jobs, time.perf_counter() - start)
+            report["counters"] = metrics.snapshot()["counters"]
+            print_report(report)
+            reports.append(report)
+    finally:
+        os.chdir(cwd)
+        upstreams.stop()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    print(f"\nUpstream requests: {upstreams.requests}, errors: {upstreams.errors}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"reports": reports, "requests": upstreams.requests, "errors": upstreams.errors}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
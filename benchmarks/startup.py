@@ -0,0 +1,126 @@
+"""
+Startup-time benchmark.
+
+Measures, as the median of several fresh Python processes:
+  - `python main.py --help`
+  - `import processor`
+  - a fully cached `python main.py <url>` run (transcript and summary already cached,
+    transcript preprocessing off so the seeded summary key matches)
+
+Usage:
+  python benchmarks/startup.py [--runs 10] [--baseline <git ref>]
+
+With --baseline, the same measurements are taken in a temporary git worktree
+of that ref, so the two trees can be compared side by side.
+"""
+import argparse
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CACHED_URL = "https://www.youtube.com/watch?v=benchCACHED"
+
+# Runs inside the measured tree to pre-fill its caches for CACHED_URL
+SEED_SCRIPT = """
+import transcript_cache, summarizer, summary_cache
+text = "cached transcript " * 2000
+transcript_cache.put_transcript("youtube", "benchCACHED", "subtitle", text)
+summary_cache.put_summary(summarizer.get_cache_key(text), summarizer.MODEL, "cached summary")
+"""
+
+def time_command(cmd, cwd, env, runs, expect=None):
+    """
+    Median wall time (seconds) of running cmd `runs` times. None if it fails
+    (non-zero exit, or `expect` missing from its output; older trees exit 0
+    on errors).
+    """
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = subprocess.run(cmd, cwd=cwd, env=env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        elapsed = time.perf_counter() - start
+        output = result.stdout.decode(errors="ignore")
+        if result.returncode != 0 or (expect and expect not in output):
+            print(f"  {' '.join(cmd[1:])} failed: {output.strip()[-200:]}")
+            return None
+        samples.append(elapsed)
+    return statistics.median(samples)
+
+def measure_tree(tree, runs):
+    work_dir = tempfile.mkdtemp(prefix="startup_bench_")
+    env = dict(os.environ)
+    env["PYTHONPATH"] = tree
+    env["TRANSCRIPT_CACHE_DIR"] = os.path.join(work_dir, "transcript_cache")
+    env["SUMMARY_CACHE_PATH"] = os.path.join(work_dir, "summary_cache.db")
+    env.pop("OPENAI_API_KEY", None)
+    # The seeded summary is keyed on the raw transcript
+    env["TRANSCRIPT_PREPROCESS"] = "0"
+
+    main_py = os.path.join(tree, "main.py")
+    results = {}
+    try:
+        results["main.py --help"] = time_command([sys.executable, main_py, "--help"], work_dir, env, runs)
+        results["import processor"] = time_command([sys.executable, "-c", "import processor"], work_dir, env, runs)
+
+        seeded = subprocess.run(
+            [sys.executable, "-c", SEED_SCRIPT], cwd=work_dir, env=env,
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        ).returncode == 0
+        if seeded:
+            results["cached main.py run"] = time_command([sys.executable, main_py, CACHED_URL], work_dir, env, runs, expect="Summary saved")
+        else:
+            print("  Tree has no transcript/summary cache, skipping cached run.")
+            results["cached main.py run"] = None
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return results
+
+def format_time(value):
+    return "n/a" if value is None else f"{value * 1000:8.1f} ms"
+
+def main():
+    parser = argparse.ArgumentParser(description="Startup-time benchmark")
+    parser.add_argument("--runs", type=int, default=10, help="Processes per measurement")
+    parser.add_argument("--baseline", help="Git ref to compare against")
+    args = parser.parse_args()
+
+    print(f"Measuring working tree ({args.runs} runs each)...")
+    current = measure_tree(REPO_ROOT, args.runs)
+
+    baseline = None
+    if args.baseline:
+        worktree = tempfile.mkdtemp(prefix="startup_baseline_")
+        print(f"Measuring {args.baseline}...")
+        try:
+            subprocess.run(
+                ["git", "worktree", "add", "--detach", worktree, args.baseline],
+                cwd=REPO_ROOT, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+            )
+            baseline = measure_tree(worktree, args.runs)
+        finally:
+            subprocess.run(
+                ["git", "worktree", "remove", "--force", worktree],
+                cwd=REPO_ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+            )
+            shutil.rmtree(worktree, ignore_errors=True)
+
+    print()
+    header = f"{'measurement':<22}{'current':>12}"
+    if baseline:
+        header += f"{args.baseline[:12]:>14}{'speedup':>10}"
+    print(header)
+    for name, value in current.items():
+        line = f"{name:<22}{format_time(value):>12}"
+        if baseline:
+            base = baseline.get(name)
+            speedup = f"{base / value:.2f}x" if base and value else "n/a"
+            line += f"{format_time(base):>14}{speedup:>10}"
+        print(line)
+
+if __name__ == "__main__":
+    main()
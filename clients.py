@@ -0,0 +1,108 @@
+import os
+import weakref
+import threading
+
+# Shared network clients. Built lazily on first use and reused by every module
+# and thread, so connections are kept alive instead of being set up per request.
+
+# Seconds before a plain HTTP request (Notion, Bilibili) gives up
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", 30))
+# Keep-alive connections kept per host
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", 10))
+# Seconds before an OpenAI request gives up (long GPT / Whisper calls)
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", 600))
+# Max open connections to the OpenAI API
+OPENAI_POOL_SIZE = int(os.getenv("OPENAI_POOL_SIZE", 10))
+
+_lock = threading.Lock()
+_http_session = None
+_openai_clients = {}
+# httpx.AsyncClient is bound to the event loop it runs on, so keep one per loop
+_async_clients = weakref.WeakKeyDictionary()
+_background_loop = None
+
+def get_http_session():
+    """
+    Returns the shared requests session (connection pooling, default timeout).
+    """
+    global _http_session
+    if _http_session is None:
+        with _lock:
+            if _http_session is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+
+                class TimeoutSession(requests.Session):
+                    def request(self, method, url, **kwargs):
+                        kwargs.setdefault("timeout", HTTP_TIMEOUT)
+                        return super().request(method, url, **kwargs)
+
+                session = TimeoutSession()
+                adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _http_session = session
+    return _http_session
+
+def get_openai_client(api_key=None):
+    """
+    Returns the shared OpenAI client for api_key (defaults to OPENAI_API_KEY).
+    """
+    api_key = api_key or os.getenv("OPENAI_API_KEY")
+    client = _openai_clients.get(api_key)
+    if client is None:
+        with _lock:
+            client = _openai_clients.get(api_key)
+            if client is None:
+                import httpx
+                from openai import OpenAI
+
+                http_client = httpx.Client(
+                    timeout=OPENAI_TIMEOUT,
+                    limits=httpx.Limits(
+                        max_connections=OPENAI_POOL_SIZE,
+                        max_keepalive_connections=OPENAI_POOL_SIZE
+                    )
+                )
+                # Retries are done by ratelimit.call, which shares backoff across threads
+                client = OpenAI(api_key=api_key, timeout=OPENAI_TIMEOUT, max_retries=0, http_client=http_client)
+                _openai_clients[api_key] = client
+    return client
+
+def get_async_http_client():
+    """
+    Returns the shared httpx.AsyncClient for the running event loop.
+    """
+    import asyncio
+
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        import httpx
+
+        client = httpx.AsyncClient(
+            timeout=HTTP_TIMEOUT,
+            follow_redirects=True,
+            limits=httpx.Limits(
+                max_connections=HTTP_POOL_SIZE,
+                max_keepalive_connections=HTTP_POOL_SIZE
+            )
+        )
+        _async_clients[loop] = client
+    return client
+
+def run_sync(coro):
+    """
+    Runs a coroutine from synchronous code on a long-lived background event
+    loop, so async clients (and their connections) survive between calls.
+    """
+    import asyncio
+
+    global _background_loop
+    if _background_loop is None:
+        with _lock:
+            if _background_loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="clients-loop", daemon=True).start()
+                _background_loop = loop
+    return asyncio.run_coroutine_threadsafe(coro, _background_loop).result()
@@ -1,55 +1,300 @@
 import sqlite3
+import threading
 import time
 import os
 
 DB_NAME = "processed_videos.db"
 
-def get_connection():
-    conn = sqlite3.connect(DB_NAME)
-    conn.row_factory = sqlite3.Row
-    return conn
+# SQLite allows 999 bound parameters per statement on older builds
+_MAX_PARAMS = 500
+
+# Seconds a worker owns a job after claiming it or saving a checkpoint. A job
+# whose lease ran out (crashed or killed run) can be taken over by another run.
+JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", 3600))
+# Runs that may fail a job before it is no longer resumed automatically
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", 3))
+
+# Stage outputs saved by checkpoint_job
+JOB_OUTPUTS = ("stage", "title", "transcript_ref", "audio_used", "summary_ref", "filepath", "date_str", "notion_page_id")
+
+class VideoStore:
+    """
+    Processed-video state on a single reused SQLite connection (WAL mode).
+    Safe to share between threads.
+    """
+    def __init__(self, path=DB_NAME):
+        self.path = path
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        # WAL lets readers and the writer work at the same time;
+        # NORMAL sync is durable enough with WAL and much cheaper per commit.
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self.init_db()
+
+    def init_db(self):
+        with self._lock:
+            self._conn.execute('''
+                CREATE TABLE IF NOT EXISTS videos (
+                    video_id TEXT PRIMARY KEY,
+                    title TEXT,
+                    uploader_id TEXT,
+                    platform TEXT,
+                    publish_date INTEGER,
+                    processed_date INTEGER,
+                    summary_path TEXT,
+                    audio_downloaded INTEGER
+                )
+            ''')
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_videos_uploader ON videos (uploader_id)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_videos_platform ON videos (platform)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_videos_processed_date ON videos (processed_date)")
+            # Newest video already seen per channel, polling stops there
+            self._conn.execute('''
+                CREATE TABLE IF NOT EXISTS channel_watermarks (
+                    channel TEXT PRIMARY KEY,
+                    last_video_id TEXT,
+                    last_timestamp INTEGER,
+                    updated_date INTEGER
+                )
+            ''')
+            # Videos being processed, with the output of every finished stage,
+            # so a crashed run can be resumed where it stopped
+            self._conn.execute('''
+                CREATE TABLE IF NOT EXISTS jobs (
+                    video_id TEXT PRIMARY KEY NOT NULL,
+                    url TEXT,
+                    platform TEXT,
+                    uploader_name TEXT,
+                    title TEXT,
+                    status TEXT,
+                    stage TEXT,
+                    transcript_ref TEXT,
+                    audio_used INTEGER,
+                    summary_ref TEXT,
+                    filepath TEXT,
+                    date_str TEXT,
+                    notion_page_id TEXT,
+                    attempts INTEGER DEFAULT 0,
+                    error TEXT,
+                    lease_owner TEXT,
+                    lease_expires REAL,
+                    created_date INTEGER,
+                    updated_date INTEGER
+                )
+            ''')
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status)")
+            self._conn.commit()
+
+    def claim_job(self, video_id, owner, url=None, platform=None, uploader_name=None, title=None, lease_seconds=None):
+        """
+        Creates or takes over the job of a video for owner, unless another
+        worker holds an unexpired lease on it. Returns the job row as a dict
+        (with the checkpoints of earlier runs), or None if it is taken.
+        """
+        if not video_id:
+            raise ValueError("A job needs a video id")
+        now = time.time()
+        expires = now + (lease_seconds or JOB_LEASE_SECONDS)
+        with self._lock:
+            with self._conn:
+                self._conn.execute('''
+                    INSERT OR IGNORE INTO jobs (video_id, url, platform, uploader_name, title, status, created_date)
+                    VALUES (?, ?, ?, ?, ?, 'pending', ?)
+                ''', (video_id, url, platform, uploader_name, title, int(now)))
+                claimed = self._conn.execute('''
+                    UPDATE jobs SET status = 'running', lease_owner = ?, lease_expires = ?, updated_date = ?
+                    WHERE video_id = ? AND (lease_owner IS NULL OR lease_owner = ? OR lease_expires < ?)
+                ''', (owner, expires, int(now), video_id, owner, now)).rowcount
+            if not claimed:
+                return None
+            row = self._conn.execute("SELECT * FROM jobs WHERE video_id = ?", (video_id,)).fetchone()
+        return dict(row)
+
+    def checkpoint_job(self, video_id, owner, lease_seconds=None, **outputs):
+        """
+        Saves the outputs of a finished stage (see JOB_OUTPUTS) and renews the lease.
+        Returns False if owner no longer holds the job.
+        """
+        unknown = set(outputs) - set(JOB_OUTPUTS)
+        if unknown:
+            raise ValueError(f"Unknown job outputs: {sorted(unknown)}")
+        columns = "".join(f"{name} = ?, " for name in outputs)
+        now = time.time()
+        with self._lock:
+            with self._conn:
+                return self._conn.execute(
+                    f"UPDATE jobs SET {columns}lease_expires = ?, updated_date = ? WHERE video_id = ? AND lease_owner = ?",
+                    (*outputs.values(), now + (lease_seconds or JOB_LEASE_SECONDS), int(now), video_id, owner)
+                ).rowcount > 0
+
+    def finish_job(self, video_id, status, error=None, owner=None):
+        """
+        Marks a job 'done' or 'failed' and releases its lease. With owner, only
+        if owner still holds it.
+        """
+        with self._lock:
+            with self._conn:
+                self._conn.execute(f'''
+                    UPDATE jobs SET status = ?, error = ?, lease_owner = NULL, lease_expires = NULL,
+                        attempts = attempts + ?, updated_date = ?
+                    WHERE video_id = ?{" AND lease_owner = ?" if owner else ""}
+                ''', (status, error, 1 if status == "failed" else 0, int(time.time()), video_id, *([owner] if owner else [])))
+
+    def unfinished_jobs(self, max_attempts=None):
+        """
+        Jobs left behind by earlier runs (interrupted, or failed fewer than
+        max_attempts times) that nobody holds a lease on.
+        """
+        with self._lock:
+            rows = self._conn.execute('''
+                SELECT * FROM jobs
+                WHERE video_id IS NOT NULL
+                    AND (status IN ('pending', 'running') OR (status = 'failed' AND attempts < ?))
+                    AND (lease_expires IS NULL OR lease_expires < ?)
+                ORDER BY created_date
+            ''', (max_attempts or JOB_MAX_ATTEMPTS, time.time())).fetchall()
+        return [dict(row) for row in rows]
+
+    def is_video_processed(self, video_id):
+        with self._lock:
+            row = self._conn.execute("SELECT 1 FROM videos WHERE video_id = ?", (video_id,)).fetchone()
+        return row is not None
+
+    def filter_unprocessed(self, video_ids):
+        """
+        Returns the ids from video_ids that are not in the database, in the same order.
+        """
+        video_ids = [v for v in video_ids if v]
+        processed = set()
+        with self._lock:
+            for i in range(0, len(video_ids), _MAX_PARAMS):
+                batch = video_ids[i:i+_MAX_PARAMS]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT video_id FROM videos WHERE video_id IN ({placeholders})", batch
+                ).fetchall()
+                processed.update(row[0] for row in rows)
+        return [v for v in video_ids if v not in processed]
+
+    def add_processed_videos(self, records):
+        """
+        Inserts many videos in one transaction. Each record is a dict with the
+        arguments of add_processed_video.
+        """
+        now = int(time.time())
+        rows = [
+            (
+                r["video_id"], r.get("title"), r.get("uploader_id"), r.get("platform"),
+                r.get("publish_date"), now, r.get("summary_path"),
+                1 if r.get("audio_downloaded") else 0
+            )
+            for r in records
+        ]
+        if not rows:
+            return
+        with self._lock:
+            with self._conn:
+                self._conn.executemany('''
+                    INSERT OR REPLACE INTO videos
+                    (video_id, title, uploader_id, platform, publish_date, processed_date, summary_path, audio_downloaded)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ''', rows)
+
+    def add_processed_video(self, video_id, title, uploader_id, platform, publish_date, summary_path, audio_downloaded=False):
+        self.add_processed_videos([{
+            "video_id": video_id,
+            "title": title,
+            "uploader_id": uploader_id,
+            "platform": platform,
+            "publish_date": publish_date,
+            "summary_path": summary_path,
+            "audio_downloaded": audio_downloaded,
+        }])
+
+    def get_watermark(self, channel):
+        """
+        Returns {'video_id', 'timestamp'} of the newest seen video of a channel, or None.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT last_video_id, last_timestamp FROM channel_watermarks WHERE channel = ?", (channel,)
+            ).fetchone()
+        if not row:
+            return None
+        return {"video_id": row[0], "timestamp": row[1]}
+
+    def set_watermark(self, channel, video_id, timestamp=None):
+        with self._lock:
+            with self._conn:
+                self._conn.execute('''
+                    INSERT OR REPLACE INTO channel_watermarks (channel, last_video_id, last_timestamp, updated_date)
+                    VALUES (?, ?, ?, ?)
+                ''', (channel, video_id, timestamp, int(time.time())))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_store():
+    """
+    Returns the shared VideoStore, opening the database on first use.
+    """
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = VideoStore(DB_NAME)
+    return _store
 
 def init_db():
-    conn = get_connection()
-    c = conn.cursor()
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS videos (
-            video_id TEXT PRIMARY KEY,
-            title TEXT,
-            uploader_id TEXT,
-            platform TEXT,
-            publish_date INTEGER,
-            processed_date INTEGER,
-            summary_path TEXT,
-            audio_downloaded INTEGER
-        )
-    ''')
-    conn.commit()
-    conn.close()
+    get_store().init_db()
 
 def is_video_processed(video_id):
-    conn = get_connection()
-    c = conn.cursor()
-    c.execute("SELECT 1 FROM videos WHERE video_id = ?", (video_id,))
-    result = c.fetchone()
-    conn.close()
-    return result is not None
+    return get_store().is_video_processed(video_id)
+
+def filter_unprocessed(video_ids):
+    return get_store().filter_unprocessed(video_ids)
 
 def add_processed_video(video_id, title, uploader_id, platform, publish_date, summary_path, audio_downloaded=False):
-    conn = get_connection()
-    c = conn.cursor()
     try:
-        c.execute('''
-            INSERT OR REPLACE INTO videos 
-            (video_id, title, uploader_id, platform, publish_date, processed_date, summary_path, audio_downloaded)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (video_id, title, uploader_id, platform, publish_date, int(time.time()), summary_path, 1 if audio_downloaded else 0))
-        conn.commit()
+        get_store().add_processed_video(video_id, title, uploader_id, platform, publish_date, summary_path, audio_downloaded)
         print(f"Recorded video {video_id} in database.")
     except Exception as e:
         print(f"Error adding video to DB: {e}")
-    finally:
-        conn.close()
 
-# Initialize on import
-init_db()
+def add_processed_videos(records):
+    try:
+        get_store().add_processed_videos(records)
+        print(f"Recorded {len(records)} videos in database.")
+    except Exception as e:
+        print(f"Error adding videos to DB: {e}")
+
+def get_watermark(channel):
+    return get_store().get_watermark(channel)
+
+def claim_job(video_id, owner, **fields):
+    return get_store().claim_job(video_id, owner, **fields)
+
+def checkpoint_job(video_id, owner, **outputs):
+    try:
+        return get_store().checkpoint_job(video_id, owner, **outputs)
+    except Exception as e:
+        print(f"Error saving job checkpoint: {e}")
+        return False
+
+def finish_job(video_id, status, error=None, owner=None):
+    try:
+        get_store().finish_job(video_id, status, error, owner)
+    except Exception as e:
+        print(f"Error finishing job: {e}")
+
+def unfinished_jobs(max_attempts=None):
+    return get_store().unfinished_jobs(max_attempts)
+
+def set_watermark(channel, video_id, timestamp=None):
+    get_store().set_watermark(channel, video_id, timestamp)
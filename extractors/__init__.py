@@ -0,0 +1,34 @@
+import re
+import importlib
+
+# URL pattern -> extractor module. A module is only imported the first time a
+# URL for its platform shows up, so startup does not pay for unused platforms.
+# Every extractor module provides get_video_id(url) and extract_transcript(url).
+_REGISTRY = []
+
+def register_extractor(platform, pattern, module_name):
+    """
+    Registers an extractor module (by import path) for URLs matching pattern.
+    """
+    _REGISTRY.append((platform, re.compile(pattern), module_name))
+
+register_extractor("youtube", r'youtube\.com|youtu\.be', "extractors.youtube")
+register_extractor("bilibili", r'bilibili\.com', "extractors.bilibili")
+
+def get_extractor(url):
+    """
+    Returns (platform, extractor module) for a URL, or (None, None).
+    """
+    for platform, pattern, module_name in _REGISTRY:
+        if pattern.search(url):
+            return platform, importlib.import_module(module_name)
+    return None, None
+
+def get_video_key(url):
+    """
+    Returns (platform, video_id) for a URL, or (None, None).
+    """
+    platform, extractor = get_extractor(url)
+    if not extractor:
+        return None, None
+    return platform, extractor.get_video_id(url)
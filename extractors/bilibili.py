@@ -1,13 +1,21 @@
+import os
 import re
 import json
-import requests
-# Using a simpler request-based approach for Bilibili to avoid complex async lib setup for now if possible,
-# or we can use bilibili_api if this fails. Bilibili subtitles are often in protobuf or json.
-# Let's try to find a library or use a known API endpoint.
-# Actually, let's use bilibili_api library as planned, but wrap it in sync.
-
+import time
 import asyncio
-from bilibili_api import video, sync
+import transcript_cache
+import metrics
+from transcript import Transcript
+import ratelimit
+from clients import get_async_http_client, run_sync
+
+# Plain Bilibili web API calls over one shared async HTTP client, so info,
+# player and subtitle requests for many videos can run concurrently.
+API_BASE = os.getenv("BILIBILI_API_BASE", "https://api.bilibili.com")
+# Videos fetched at the same time by extract_transcripts_async
+CONCURRENCY = int(os.getenv("BILIBILI_CONCURRENCY", 4))
+
+USER_AGENT = 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.114 Safari/537.36'
 
 def get_bvid(url):
     """
@@ -18,87 +26,122 @@ def get_bvid(url):
         return match.group(1)
     return None
 
-def extract_transcript(url):
-    """
-    Extracts transcript/subtitles from a Bilibili video URL.
-    Returns a single string of text.
-    """
-    bvid = get_bvid(url)
-    if not bvid:
-        raise ValueError(f"Could not extract BVid from {url}")
+# Common name used by the extractor registry
+get_video_id = get_bvid
 
-    async def _get_subtitle():
-        v = video.Video(bvid=bvid)
-        # Get video info to find cid (if needed) or just get subtitles
-        # bilibili-api has get_subtitle
-        try:
-             # We might need to get the view info first to see available subtitles
-            info = await v.get_info()
-            # The library might have changed, but let's try getting subtitle URL
-            # Note: explicit subtitle fetching might be needed.
-            # Let's check available subtitles
-            # This is complex without docs. Let's try a simpler approach if the library is too complex blindly.
-            # But let's try the standard way.
-            
-            # Alternative: web scraping the initial state (often contains subtitle info)
-            pass
-        except Exception as e:
-            print(f"Error interacting with Bilibili API: {e}")
-            return None
+def _cookies():
+    # Subtitles of many videos are only returned to logged-in users
+    sessdata = os.getenv("BILIBILI_SESSDATA")
+    return {"SESSDATA": sessdata} if sessdata else None
 
-    # Let's use a reliable scraping method or the library.
-    # The library `bilibili_api` is good but sometimes requires credential.
-    # Let's try `bilibili-api-python` standard usage.
-    
-    try:
-        # Create video object
-        v = video.Video(bvid=bvid)
-        
-        # Get info to find cid
-        # We need headers for requests
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.114 Safari/537.36',
-            'Referer': f'https://www.bilibili.com/video/{bvid}/'
-        }
-        
-        info = sync(v.get_info())
-        cid = info['cid']
-        
-        params = {'bvid': bvid, 'cid': cid}
-        # https://api.bilibili.com/x/player/v2 might need login or wbi signature
-        # Try a simpler public endpoint or scrape from get_info response if subtitles are there?
-        # get_info (v2) response usually doesn't have subtitles.
-        # But let's try calling the player api with headers.
-        
-        resp = requests.get('https://api.bilibili.com/x/player/v2', params=params, headers=headers)
-        
+async def _get_json(client, url, headers, params=None):
+    async def get():
+        resp = await client.get(url, params=params, headers=headers, cookies=_cookies())
+        metrics.incr("bytes_downloaded", len(resp.content), source="bilibili")
+        if resp.status_code in ratelimit.RETRY_STATUSES:
+            raise ratelimit.RetryableResponse(
+                f"Bilibili HTTP {resp.status_code}",
+                ratelimit.parse_retry_after(resp.headers.get("retry-after"))
+            )
         try:
             data = resp.json()
         except json.JSONDecodeError:
             print(f"Failed to decode JSON from Bilibili API. Response: {resp.text[:100]}...")
             return None
-        
-        subtitle_url = None
-        if data['code'] == 0 and 'subtitle' in data['data']:
-            subs = data['data']['subtitle']['subtitles']
-            if subs:
-                subtitle_url = subs[0]['url']
-                if subtitle_url.startswith('//'):
-                    subtitle_url = 'https:' + subtitle_url
-        
-        if subtitle_url:
-            sub_resp = requests.get(subtitle_url, headers=headers)
-            try:
-                sub_data = sub_resp.json()
-                # body contains list of {from, to, content}
-                full_text = " ".join([item['content'] for item in sub_data['body']])
-                return full_text
-            except json.JSONDecodeError:
-                print("Failed to decode subtitle JSON.")
-                return None
-            
+        if isinstance(data, dict) and data.get("code") in ratelimit.RETRY_CODES:
+            raise ratelimit.RetryableResponse(f"Bilibili API code {data.get('code')}")
+        return data
+
+    # Throttling (HTTP 412/429, or code -412/-509 in the body) is retried with
+    # backoff; raises once the retries are used up
+    return await ratelimit.call_async("bilibili", get)
+
+async def _fetch_transcript(client, bvid):
+    """
+    Fetches the first subtitle track of one video. Returns a Transcript or None.
+    """
+    # We need headers for requests
+    headers = {
+        'User-Agent': USER_AGENT,
+        'Referer': f'https://www.bilibili.com/video/{bvid}/'
+    }
+
+    # Video info, for the cid
+    info = await _get_json(client, f"{API_BASE}/x/web-interface/view", headers, {'bvid': bvid})
+    if not info or info.get('code') != 0:
+        print(f"Failed to get Bilibili video info for {bvid}: {info and info.get('message')}")
+        return None
+    cid = info['data']['cid']
+
+    # https://api.bilibili.com/x/player/v2 might need login or wbi signature
+    data = await _get_json(client, f"{API_BASE}/x/player/v2", headers, {'bvid': bvid, 'cid': cid})
+    if not data:
         return None
 
-    except Exception as e:
-        print(f"Error extracting Bilibili transcript: {e}")
+    subtitle_url = None
+    if data['code'] == 0 and 'subtitle' in data['data']:
+        subs = data['data']['subtitle']['subtitles']
+        if subs:
+            subtitle_url = subs[0]['url']
+            if subtitle_url.startswith('//'):
+                subtitle_url = 'https:' + subtitle_url
+
+    if not subtitle_url:
+        return None
+
+    sub_data = await _get_json(client, subtitle_url, headers)
+    if not sub_data:
+        print("Failed to decode subtitle JSON.")
         return None
+    # body contains list of {from, to, content}
+    return Transcript.from_segments(
+        (item['from'], item['to'], item['content']) for item in sub_data['body']
+    )
+
+async def extract_transcripts_async(bvids, concurrency=None):
+    """
+    Extracts subtitles for many Bilibili videos concurrently.
+    Returns {bvid: Transcript or None}.
+    """
+    results = {}
+    to_fetch = []
+    for bvid in dict.fromkeys(bvids):
+        cached = transcript_cache.get_transcript("bilibili", bvid, "subtitle")
+        if cached:
+            results[bvid] = cached
+        else:
+            to_fetch.append(bvid)
+
+    if not to_fetch:
+        return results
+
+    client = get_async_http_client()
+    semaphore = asyncio.Semaphore(concurrency or CONCURRENCY)
+
+    async def fetch(bvid):
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                text = await _fetch_transcript(client, bvid)
+            except Exception as e:
+                print(f"Error extracting Bilibili transcript: {e}")
+                text = None
+            metrics.observe("subtitle_fetch", time.perf_counter() - start, platform="bilibili")
+        if text:
+            transcript_cache.put_transcript("bilibili", bvid, "subtitle", text)
+        results[bvid] = text
+
+    await asyncio.gather(*(fetch(bvid) for bvid in to_fetch))
+    return results
+
+def extract_transcript(url):
+    """
+    Extracts transcript/subtitles from a Bilibili video URL.
+    Returns a Transcript with the subtitle timings.
+    """
+    bvid = get_bvid(url)
+    if not bvid:
+        raise ValueError(f"Could not extract BVid from {url}")
+
+    results = run_sync(extract_transcripts_async([bvid]))
+    return results.get(bvid)
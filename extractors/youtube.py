@@ -1,5 +1,7 @@
-from youtube_transcript_api import YouTubeTranscriptApi
 from urllib.parse import urlparse, parse_qs
+import transcript_cache
+import metrics
+from transcript import Transcript
 
 def get_video_id(url):
     """
@@ -22,13 +24,19 @@ def get_video_id(url):
 def extract_transcript(url):
     """
     Extracts transcript from a YouTube video URL.
-    Returns a single string of text.
+    Returns a Transcript with the caption timings.
     """
     video_id = get_video_id(url)
     if not video_id:
         raise ValueError(f"Could not extract video ID from {url}")
 
+    cached = transcript_cache.get_transcript("youtube", video_id, "subtitle")
+    if cached:
+        return cached
+
     try:
+        from youtube_transcript_api import YouTubeTranscriptApi
+
         # Instantiate the API
         yt = YouTubeTranscriptApi()
         
@@ -60,10 +68,13 @@ def extract_transcript(url):
             return None
 
         # Fetch the content
-        data = transcript.fetch()
-        # Combine text
-        full_text = " ".join([t.text for t in data])
-        return full_text
+        with metrics.timer("subtitle_fetch", platform="youtube"):
+            data = transcript.fetch()
+        full_transcript = Transcript.from_segments(
+            (t.start, t.start + t.duration, t.text) for t in data
+        )
+        transcript_cache.put_transcript("youtube", video_id, "subtitle", full_transcript)
+        return full_transcript
         
     except Exception as e:
         print(f"Error getting transcript: {e}")
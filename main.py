@@ -1,64 +1,202 @@
 import argparse
 import os
-from dotenv import load_dotenv
+import sys
+import json
+import time
+import re
+import threading
+
+def read_urls(args):
+    """
+    URLs from the command line plus --input file ('-' for stdin), without duplicates.
+    Empty lines and lines starting with '#' are ignored.
+    """
+    urls = list(args.urls)
+    if args.input:
+        f = sys.stdin if args.input == "-" else open(args.input, "r", encoding="utf-8")
+        try:
+            for line in f:
+                line = line.strip()
+                if line and not line.startswith("#"):
+                    urls.append(line)
+        finally:
+            if f is not sys.stdin:
+                f.close()
+    return list(dict.fromkeys(urls))
+
+def _stage_extract(job):
+    from extractors import get_extractor
+
+    platform, extractor = get_extractor(job.url)
+    if not extractor:
+        return job.fail("Unsupported URL. Please use a YouTube or Bilibili video URL.")
+    job.platform = platform
+    job.video_id = extractor.get_video_id(job.url)
+
+    transcript = extractor.extract_transcript(job.url)
+    if not transcript:
+        print("Failed to extract transcript/subtitles directly. Attempting audio transcription fallback...")
+        from audio_handler import process_video_audio
+        transcript = process_video_audio(job.url)
+        job.audio_used = True
+
+    if not transcript:
+        return job.fail("Failed to extract transcript from both subtitles and audio.")
+
+    job.transcript = transcript
+    return True
+
+def _stage_preprocess(job):
+    from preprocess import preprocess
+    job.transcript = preprocess(job.transcript)
+    return True
+
+def _stage_summarize(job, echo=False):
+    """
+    Streams the summary into the output file as it is written (and to the
+    terminal with echo), instead of waiting for the whole completion.
+    """
+    print(f"Transcript extracted (Length: {len(job.transcript.text)} chars). Summarizing...")
+
+    # Save to output folder
+    # simple sanitizer
+    sanitized_url = re.sub(r'[^\w\-_]', '_', job.url)
+    # Limit length
+    sanitized_url = sanitized_url[-30:]
+
+    os.makedirs("output", exist_ok=True)
+    filename = f"output/summary_{int(time.time())}_{sanitized_url}.md"
+
+    def print_text(piece):
+        sys.stdout.write(piece)
+        sys.stdout.flush()
+
+    from summarizer import summarize_to_file
+    if echo:
+        print("\n--- Summary ---\n")
+    job.summary_text = summarize_to_file(
+        job.transcript, filename, header=f"# Summary for {job.url}\n\n", on_text=print_text if echo else None
+    )
+    if echo:
+        print("\n\n----------------\n")
+    job.transcript = None
+
+    job.filepath = filename
+    print(f"Summary saved to {filename}")
+    return True
+
+def result_record(job):
+    """
+    One JSONL record for a finished job.
+    """
+    return {
+        "url": job.url,
+        "platform": job.platform,
+        "video_id": job.video_id,
+        "status": job.status,
+        "error": job.error,
+        "output": job.filepath,
+        "audio_used": job.audio_used,
+        "timings": {stage: round(seconds, 3) for stage, seconds in job.timings.items()},
+        "total_seconds": round(sum(job.timings.values()), 3),
+    }
+
+def run_batch(urls, jobs=4, results_path=None, print_summary=False):
+    """
+    Summarizes many URLs concurrently through the staged pipeline.
+    results_path is a JSONL file to append to, '-' for stdout, or an open file.
+    Returns the finished jobs.
+    """
+    from pipeline import Pipeline, Stage
+    from processor import VideoJob
+
+    results_file = None
+    opened = False
+    if results_path == "-":
+        results_file = sys.stdout
+    elif hasattr(results_path, "write"):
+        results_file = results_path
+    elif results_path:
+        directory = os.path.dirname(results_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        results_file = open(results_path, "a", encoding="utf-8")
+        opened = True
+    write_lock = threading.Lock()
+
+    def on_done(job):
+        if job.status == "failed":
+            print(f"Failed: {job.url} ({job.error})")
+        if results_file:
+            with write_lock:
+                results_file.write(json.dumps(result_record(job), ensure_ascii=False) + "\n")
+                results_file.flush()
+
+    stages = [
+        Stage("extract", _stage_extract, workers=jobs),
+        Stage("preprocess", _stage_preprocess),
+        # The summary is printed as it streams in when there is only one video
+        Stage("summarize", lambda job: _stage_summarize(job, echo=print_summary), workers=jobs),
+    ]
+    pipeline = Pipeline(stages, queue_size=max(1, jobs), on_done=on_done)
+    try:
+        return pipeline.run(VideoJob(url) for url in urls)
+    finally:
+        if opened:
+            results_file.close()
 
 def main():
     parser = argparse.ArgumentParser(description="Video Summarizer")
-    parser.add_argument("url", help="URL of the video to summarize")
+    parser.add_argument("urls", nargs="*", metavar="url", help="URL(s) of the video(s) to summarize")
+    parser.add_argument("-i", "--input", help="File with one URL per line ('-' reads stdin)")
+    parser.add_argument("-j", "--jobs", type=int, default=4, help="Videos processed at the same time (default: 4)")
+    parser.add_argument("--metrics", help="Write run metrics to this file (Prometheus text for .prom, JSON otherwise)")
+    parser.add_argument("--results", help="Append one JSON record per video to this file ('-' for stdout). "
+                                          "Defaults to output/results_<time>.jsonl for more than one URL.")
     args = parser.parse_args()
 
+    urls = read_urls(args)
+    if not urls:
+        parser.error("no URLs given")
+
+    # Imported after argument parsing so --help stays fast
+    from dotenv import load_dotenv
     load_dotenv()
-    
-    print(f"Processing URL: {args.url}")
-    
-    transcript = None
-    try:
-        if 'youtube.com' in args.url or 'youtu.be' in args.url:
-            from extractors.youtube import extract_transcript
-            transcript = extract_transcript(args.url)
-        elif 'bilibili.com' in args.url:
-            from extractors.bilibili import extract_transcript
-            transcript = extract_transcript(args.url)
-        else:
-            print("Unsupported URL. Please use a YouTube or Bilibili video URL.")
-            return
-
-        if not transcript:
-            print("Failed to extract transcript/subtitles directly. Attempting audio transcription fallback...")
-            from audio_handler import process_video_audio
-            transcript = process_video_audio(args.url)
-
-        if not transcript:
-            print("Failed to extract transcript from both subtitles and audio.")
-            return
-
-        print(f"Transcript extracted (Length: {len(transcript)} chars). Summarizing...")
-        
-        from summarizer import summarize
-        summary = summarize(transcript)
-        
-        print("\n--- Summary ---\n")
-        print(summary)
-        print("\n----------------\n")
-        
-        # Save to output folder
-        import time
-        import re
-        
-        # simple sanitizer
-        sanitized_url = re.sub(r'[^\w\-_]', '_', args.url)
-        # Limit length
-        sanitized_url = sanitized_url[-30:] 
-        
-        filename = f"output/summary_{int(time.time())}_{sanitized_url}.md"
-        with open(filename, "w", encoding="utf-8") as f:
-            f.write(f"# Summary for {args.url}\n\n")
-            f.write(summary)
-            
-        print(f"Summary saved to {filename}")
 
+    single = len(urls) == 1
+    results_path = args.results
+    if not results_path and not single:
+        results_path = f"output/results_{int(time.time())}.jsonl"
+    results = results_path
+    if results_path == "-":
+        # stdout carries only the JSONL records, all progress output goes to stderr
+        results = sys.stdout
+        sys.stdout = sys.stderr
+
+    if single:
+        print(f"Processing URL: {urls[0]}")
+    else:
+        print(f"Processing {len(urls)} URLs with {args.jobs} jobs...")
+
+    done = 0
+    try:
+        start = time.time()
+        finished = run_batch(urls, jobs=max(1, args.jobs), results_path=results, print_summary=single)
+        done = sum(1 for job in finished if job.status == "done")
+        if not single:
+            print(f"Finished {done}/{len(urls)} videos in {time.time() - start:.1f}s.")
+            if results_path and results_path != "-":
+                print(f"Results written to {results_path}")
     except Exception as e:
         print(f"An error occurred: {e}")
 
+    import metrics
+    if not single:
+        metrics.print_summary()
+    if args.metrics:
+        metrics.write_report(args.metrics)
+    # Non-zero exit when any video failed, for scripts and benchmarks
+    return 0 if done == len(urls) else 1
+
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
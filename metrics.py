@@ -0,0 +1,170 @@
+import json
+import math
+import time
+import threading
+from contextlib import contextmanager
+
+# In-process run metrics: timers (seconds per call) and counters, both with
+# optional labels, e.g.
+#   with metrics.timer("whisper"): ...
+#   metrics.incr("cache_hits", cache="summary")
+# Exported as a JSON run report or in the Prometheus text format.
+PREFIX = "yuki"
+# Samples kept per timer for percentiles; count and sum are always exact
+MAX_SAMPLES = 10000
+
+_lock = threading.Lock()
+_timers = {}
+_counters = {}
+_started_at = time.time()
+
+def _key(name, labels):
+    return (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+
+def incr(name, value=1, **labels):
+    """
+    Adds value to a counter.
+    """
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+def observe(name, seconds, **labels):
+    """
+    Records one timing sample in seconds.
+    """
+    key = _key(name, labels)
+    with _lock:
+        timer = _timers.get(key)
+        if timer is None:
+            timer = _timers[key] = {"count": 0, "sum": 0.0, "max": 0.0, "samples": []}
+        timer["count"] += 1
+        timer["sum"] += seconds
+        timer["max"] = max(timer["max"], seconds)
+        if len(timer["samples"]) < MAX_SAMPLES:
+            timer["samples"].append(seconds)
+
+@contextmanager
+def timer(name, **labels):
+    """
+    Times the block. Blocks that raise are recorded too.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start, **labels)
+
+def reset():
+    global _started_at
+    with _lock:
+        _timers.clear()
+        _counters.clear()
+        _started_at = time.time()
+
+def _percentile(ordered, p):
+    """
+    Nearest-rank percentile of a sorted, non-empty list.
+    """
+    index = max(0, min(len(ordered) - 1, math.ceil(p / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+def _label_text(labels):
+    return ",".join(f"{k}={v}" for k, v in labels)
+
+def snapshot():
+    """
+    Current metrics as a JSON-serializable dict.
+    """
+    with _lock:
+        timers = {k: dict(v, samples=sorted(v["samples"])) for k, v in _timers.items()}
+        counters = dict(_counters)
+        started_at = _started_at
+
+    report = {
+        "started_at": started_at,
+        "wall_seconds": round(time.time() - started_at, 3),
+        "timers": [],
+        "counters": [],
+    }
+    for (name, labels), t in sorted(timers.items()):
+        report["timers"].append({
+            "name": name,
+            "labels": dict(labels),
+            "count": t["count"],
+            "total": round(t["sum"], 4),
+            "mean": round(t["sum"] / t["count"], 4),
+            "p50": round(_percentile(t["samples"], 50), 4),
+            "p95": round(_percentile(t["samples"], 95), 4),
+            "max": round(t["max"], 4),
+        })
+    for (name, labels), value in sorted(counters.items()):
+        report["counters"].append({"name": name, "labels": dict(labels), "value": value})
+    return report
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _prom_labels(labels, extra=None):
+    items = list(labels) + list(extra or [])
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in items) + "}"
+
+def to_prometheus():
+    """
+    Current metrics in the Prometheus text exposition format.
+    Timers become summaries in seconds, counters become *_total counters.
+    """
+    with _lock:
+        timers = {k: dict(v, samples=sorted(v["samples"])) for k, v in _timers.items()}
+        counters = dict(_counters)
+
+    lines = []
+    seen = set()
+    for (name, labels), t in sorted(timers.items()):
+        metric = f"{PREFIX}_{name}_seconds"
+        if metric not in seen:
+            seen.add(metric)
+            lines.append(f"# TYPE {metric} summary")
+        for q in (0.5, 0.95):
+            lines.append(f"{metric}{_prom_labels(labels, [('quantile', q)])} {_percentile(t['samples'], q * 100):.6f}")
+        lines.append(f"{metric}_sum{_prom_labels(labels)} {t['sum']:.6f}")
+        lines.append(f"{metric}_count{_prom_labels(labels)} {t['count']}")
+    for (name, labels), value in sorted(counters.items()):
+        metric = f"{PREFIX}_{name}_total"
+        if metric not in seen:
+            seen.add(metric)
+            lines.append(f"# TYPE {metric} counter")
+        lines.append(f"{metric}{_prom_labels(labels)} {value}")
+    return "\n".join(lines) + "\n"
+
+def write_report(path):
+    """
+    Writes the metrics to path: Prometheus text for .prom/.txt files, JSON otherwise.
+    """
+    if path.endswith((".prom", ".txt")):
+        content = to_prometheus()
+    else:
+        content = json.dumps(snapshot(), indent=2, ensure_ascii=False) + "\n"
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(content)
+    print(f"Metrics written to {path}")
+
+def print_summary():
+    """
+    Prints where the run's time went and the counters worth a glance.
+    """
+    report = snapshot()
+    if not report["timers"] and not report["counters"]:
+        return
+    print("-" * 20)
+    print(f"{'timer':<44}{'n':>6}{'total s':>10}{'p50 ms':>10}{'p95 ms':>10}")
+    for t in report["timers"]:
+        name = t["name"] + (f"[{_label_text(t['labels'].items())}]" if t["labels"] else "")
+        print(f"{name:<44}{t['count']:>6}{t['total']:>10.2f}{t['p50'] * 1000:>10.1f}{t['p95'] * 1000:>10.1f}")
+    if report["counters"]:
+        print(f"{'counter':<44}{'value':>16}")
+    for c in report["counters"]:
+        name = c["name"] + (f"[{_label_text(c['labels'].items())}]" if c["labels"] else "")
+        print(f"{name:<44}{c['value']:>16}")
@@ -1,25 +1,42 @@
+import argparse
 import asyncio
+import json
 import time
 import os
-from bilibili_api import user, sync
+import random
+import signal
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
-import processor
-import database
 
-# Load env vars
+# Load env vars (before the project modules read their settings)
 load_dotenv()
 
+import processor
+import database
+import notion_publisher
+import metrics
+import ratelimit
+
 # Target Uploader ID (Space ID) for Bilibili
 BILIBILI_UID = 1515375273 
 # Target Channel URL for YouTube
 # Using /videos to ensure we get chronological uploads
 YOUTUBE_CHANNEL = "https://www.youtube.com/@SavvyCapitalist%E8%81%AA%E6%98%8E%E5%B0%8F%E8%B5%84/videos"
 
-# Configure Bilibili User Agent to avoid 412
-import bilibili_api
-# settings.user_agent is not available in all versions, but HEADERS is a global dict
-bilibili_api.HEADERS["User-Agent"] = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
-bilibili_api.HEADERS["Referer"] = "https://www.bilibili.com/"
+# Channel list file (JSON, TOML or YAML). Falls back to the two channels above if missing.
+CHANNELS_FILE = os.getenv("CHANNELS_FILE", "channels.json")
+# Max number of channels checked at the same time
+DEFAULT_CONCURRENCY = 4
+# Full-metadata yt-dlp lookups run at the same time per YouTube channel
+YOUTUBE_DETAIL_WORKERS = int(os.getenv("YOUTUBE_DETAIL_WORKERS", 4))
+# --daemon: seconds between polls of a channel (per channel: "interval" in the
+# channel file, or a top-level "interval" for all of them)
+DEFAULT_INTERVAL = int(os.getenv("MONITOR_INTERVAL", 900))
+# --daemon: each wait is randomly up to this fraction longer or shorter
+JITTER = float(os.getenv("MONITOR_JITTER", 0.1))
+# --daemon: seconds between incremental refreshes of the Notion URL index
+NOTION_REFRESH_INTERVAL = int(os.getenv("MONITOR_NOTION_REFRESH", 600))
 
 # Helper to load cookies for Cloud Execution
 def load_cookies():
@@ -43,14 +60,74 @@ def load_cookies():
             f.write(cookie_content)
         print("Generated cookies.txt from environment variable.")
 
-# Load env vars
-load_cookies()
+def setup():
+    """
+    One-time process setup: Bilibili headers and cookies.txt.
+    Kept out of import time so importing this module does not write files.
+    """
+    # Configure Bilibili User Agent to avoid 412
+    import bilibili_api
+    # settings.user_agent is not available in all versions, but HEADERS is a global dict
+    bilibili_api.HEADERS["User-Agent"] = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+    bilibili_api.HEADERS["Referer"] = "https://www.bilibili.com/"
+
+    load_cookies()
+
+
+def load_channels(path=CHANNELS_FILE):
+    """
+    Loads the channel list from a JSON, TOML or YAML file.
+    Returns (channels, concurrency). Each channel is a dict with 'platform' and
+    either 'uid' (bilibili) or 'url' (youtube), and optionally 'interval'
+    (seconds between polls in --daemon mode; defaults to the file's 'interval').
+    """
+    if not os.path.exists(path):
+        print(f"Channel file {path} not found. Using built-in channels.")
+        channels = [
+            {"platform": "bilibili", "uid": BILIBILI_UID},
+            {"platform": "youtube", "url": YOUTUBE_CHANNEL},
+        ]
+        return channels, None
+
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".toml":
+        try:
+            import tomllib
+        except ImportError:
+            import tomli as tomllib
+        with open(path, "rb") as f:
+            config = tomllib.load(f)
+    elif ext in (".yaml", ".yml"):
+        import yaml
+        with open(path, "r", encoding="utf-8") as f:
+            config = yaml.safe_load(f) or {}
+    else:
+        with open(path, "r", encoding="utf-8") as f:
+            config = json.load(f)
 
+    channels = []
+    for ch in config.get("channels", []):
+        if ch.get("enabled", True) is False:
+            continue
+        if config.get("interval") and not ch.get("interval"):
+            ch["interval"] = config["interval"]
+        platform = ch.get("platform")
+        if platform == "bilibili" and ch.get("uid"):
+            channels.append(ch)
+        elif platform == "youtube" and ch.get("url"):
+            channels.append(ch)
+        else:
+            print(f"Skipping invalid channel entry: {ch}")
+
+    return channels, config.get("concurrency")
 
-async def check_new_videos(uid):
+async def check_new_videos(uid, executor=None, pipeline=None):
     # ... (Keep existing Bilibili logic, renamed slightly for clarity or just kept as is)
     print(f"Checking Bilibili videos for user {uid}...")
     try:
+        from bilibili_api import user
+        from extractors import bilibili as bilibili_extractor
+
         # Check for credentials in env
         sessdata = os.getenv("BILIBILI_SESSDATA")
         bili_jct = os.getenv("BILIBILI_JCT")
@@ -63,36 +140,62 @@ async def check_new_videos(uid):
             credential = Credential(sessdata=sessdata, bili_jct=bili_jct, buvid3=buvid3)
             
         u = user.User(uid, credential=credential)
-        user_info = await u.get_user_info()
+        user_info = await ratelimit.call_async("bilibili", u.get_user_info)
         uploader_name = user_info['name']
         print(f"Bilibili Uploader: {uploader_name}")
 
-        videos_data = await u.get_videos(ps=10) 
+        videos_data = await ratelimit.call_async("bilibili", lambda: u.get_videos(ps=10))
         videos = videos_data['list']['vlist']
         
         current_time = time.time()
         processed_count = 0
+        found_count = 0
+        unprocessed = set(database.filter_unprocessed([v['bvid'] for v in videos]))
         
+        new_videos = []
         for v in videos:
             bvid = v['bvid']
+            if bvid not in unprocessed:
+                continue
             title = v['title']
             created = v['created']
             age = current_time - created
             
             if age <= 86400: # 24 hours
                 print(f"Found new Bilibili video: {title} ({bvid}) - {age/3600:.1f}h ago")
-                url = f"https://www.bilibili.com/video/{bvid}"
-                success = processor.process_video(
-                    url=url, 
-                    platform="bilibili",
-                    uploader_name=uploader_name,
-                    title=title,
-                    video_id=bvid
-                )
-                if success:
+                new_videos.append(v)
+
+        # Fetch all subtitles concurrently before handing the videos to processing
+        transcripts = {}
+        if new_videos:
+            transcripts = await bilibili_extractor.extract_transcripts_async([v['bvid'] for v in new_videos])
+
+        loop = asyncio.get_running_loop()
+        for v in new_videos:
+            bvid = v['bvid']
+            url = f"https://www.bilibili.com/video/{bvid}"
+            job = processor.VideoJob(
+                url=url,
+                platform="bilibili",
+                uploader_name=uploader_name,
+                title=v['title'],
+                video_id=bvid
+            )
+            job.transcript = transcripts.get(bvid)
+            # Fetched without subtitles: go straight to the audio fallback
+            job.subtitles_missing = bvid in transcripts and not job.transcript
+            # Both calls block (submit waits on backpressure), keep them off the event loop
+            if pipeline:
+                await loop.run_in_executor(executor, pipeline.submit, job)
+            else:
+                await loop.run_in_executor(executor, processor.process_videos, [job])
+                if job.success:
                     processed_count += 1
+            found_count += 1
         
-        if processed_count > 0:
+        if pipeline and found_count > 0:
+            print(f"Queued {found_count} new Bilibili videos.")
+        elif processed_count > 0:
             print(f"Processed {processed_count} new Bilibili videos.")
         else:
             print("No new Bilibili videos found.")
@@ -100,7 +203,21 @@ async def check_new_videos(uid):
     except Exception as e:
         print(f"Error checking Bilibili: {e}")
 
-def check_youtube_new_videos(channel_url):
+def _fetch_upload_info(url):
+    """
+    Full (slow) yt-dlp extraction of one video. Returns (upload_date, timestamp).
+    """
+    import yt_dlp
+
+    opts_full = {'quiet':True, 'no_warnings':True}
+    if os.path.exists('cookies.txt'):
+        opts_full['cookiefile'] = 'cookies.txt'
+
+    with yt_dlp.YoutubeDL(opts_full) as ydl_full:
+        full_info = ydl_full.extract_info(url, download=False)
+        return full_info.get('upload_date'), full_info.get('timestamp')
+
+def check_youtube_new_videos(channel_url, pipeline=None):
     print(f"Checking YouTube videos for {channel_url}...")
     import yt_dlp
     import datetime
@@ -123,85 +240,116 @@ def check_youtube_new_videos(channel_url):
 
     try:
         processed_count = 0
+        found_count = 0
         with yt_dlp.YoutubeDL(ydl_opts) as ydl:
             info = ydl.extract_info(channel_url, download=False)
             
-            uploader_name = info.get('uploader', 'Unknown_YouTuber')
-            # Fallback if top level uploader is generic, sometimes it's in entries
-            if uploader_name == 'Unknown_YouTuber' and info.get('entries'):
-                uploader_name = info['entries'][0].get('uploader', 'YouTube_Channel')
-                
-            print(f"YouTube Uploader: {uploader_name}")
-            
-            entries = info.get('entries', [])
-            current_time = time.time()
+        uploader_name = info.get('uploader', 'Unknown_YouTuber')
+        # Fallback if top level uploader is generic, sometimes it's in entries
+        if uploader_name == 'Unknown_YouTuber' and info.get('entries'):
+            uploader_name = info['entries'][0].get('uploader', 'YouTube_Channel')
             
-            for entry in entries:
-                video_id = entry.get('id')
-                title = entry.get('title')
-                url = entry.get('url') # or construct https://www.youtube.com/watch?v={id}
-                if not url:
-                    url = f"https://www.youtube.com/watch?v={video_id}"
-
-                # yt-dlp flat extraction might not give exact timestamp, usually gives upload_date like '20231218'
-                # or 'timestamp' if available. entries usually have 'timestamp' set to None for flat extraction sometimes.
-                # But 'upload_date' is reliable 'YYYYMMDD'.
-                # For 24h check, strict timestamp is better.
-                # If we only have date, we assume 00:00 of that date, which might be risky.
-                # However, for flat playlist, often we don't get full details. 
-                # Improving: We can check if video_id is in DB first. If so, skip.
-                # If not in DB, we fetch full info OR just rely on upload_date matching today/yesterday.
-                
-                
-                # Check DB first to save time
-                if database.is_video_processed(video_id):
-                    continue
-                
-                # If flat extraction didn't give date, we must fetch full info for this video
-                upload_date_str = entry.get('upload_date')
-                
-                if not upload_date_str:
-                    print(f"Fetching full details for candidate: {title}")
-                    try:
-                        # Create a new YDL instance or reuse? Reusing is fine but we need different opts if we want full info?
-                        # actually existing opts are 'extract_flat': True. We need a new instance/opts for full extraction logic
-                        # or just overriding.
-                         opts_full = {'quiet':True, 'no_warnings':True}
-                         if os.path.exists('cookies.txt'):
-                             opts_full['cookiefile'] = 'cookies.txt'
-                         
-                         with yt_dlp.YoutubeDL(opts_full) as ydl_full:
-                             full_info = ydl_full.extract_info(url, download=False)
-                             upload_date_str = full_info.get('upload_date')
-                    except Exception as e:
-                        print(f"Could not fetch full info for {url}: {e}")
-                        continue
-
-                if not upload_date_str:
-                    print(f"Still no date for {title}, skipping.")
+        print(f"YouTube Uploader: {uploader_name}")
+        
+        entries = [e for e in (info.get('entries') or []) if e.get('id')]
+
+        # Entries are newest first. Everything from the watermark on was
+        # already looked at in an earlier poll, so stop there.
+        watermark = database.get_watermark(channel_url)
+        if watermark:
+            for i, entry in enumerate(entries):
+                if entry['id'] == watermark['video_id']:
+                    entries = entries[:i]
+                    break
+
+        if not entries:
+            print("No new YouTube videos since last check.")
+            return
+
+        # One query for the whole list instead of one per video
+        unprocessed = set(database.filter_unprocessed([e['id'] for e in entries]))
+        candidates = [e for e in entries if e['id'] in unprocessed]
+
+        # Flat extraction usually has no upload_date, fetch full details for
+        # those candidates concurrently.
+        upload_info = {}
+        need_details = [e for e in candidates if not e.get('upload_date')]
+        if need_details:
+            print(f"Fetching full details for {len(need_details)} candidates...")
+            def fetch(entry):
+                url = entry.get('url') or f"https://www.youtube.com/watch?v={entry['id']}"
+                try:
+                    return entry['id'], _fetch_upload_info(url)
+                except Exception as e:
+                    print(f"Could not fetch full info for {url}: {e}")
+                    return entry['id'], None
+            with ThreadPoolExecutor(max_workers=YOUTUBE_DETAIL_WORKERS) as pool:
+                upload_info = dict(pool.map(fetch, need_details))
+
+        today = datetime.datetime.now().date()
+        yesterday = today - datetime.timedelta(days=1)
+        # Videos whose outcome is not known yet; the watermark must stay behind them
+        unsettled = set()
+
+        for entry in candidates:
+            video_id = entry['id']
+            title = entry.get('title')
+            url = entry.get('url') # or construct https://www.youtube.com/watch?v={id}
+            if not url:
+                url = f"https://www.youtube.com/watch?v={video_id}"
+
+            upload_date_str = entry.get('upload_date')
+            if not upload_date_str:
+                details = upload_info.get(video_id)
+                if details is None:
+                    unsettled.add(video_id)
                     continue
-                    
-                # Convert to date object
-                upload_date = datetime.datetime.strptime(upload_date_str, "%Y%m%d").date()
-                today = datetime.datetime.now().date()
-                yesterday = today - datetime.timedelta(days=1)
+                upload_date_str, timestamp = details
+                entry['timestamp'] = entry.get('timestamp') or timestamp
+
+            if not upload_date_str:
+                print(f"Still no date for {title}, skipping.")
+                continue
                 
-                # Simple check: is it today or yesterday?
-                print(f"Checking {title} - Date: {upload_date} vs Threshold: {yesterday}")
-                if upload_date >= yesterday:
-                    print(f"Found new YouTube video candidate: {title} ({upload_date})")
-                    # Process
-                    success = processor.process_video(
-                        url=url, 
-                        platform="youtube",
-                        uploader_name=uploader_name,
-                        title=title,
-                        video_id=video_id
-                    )
-                    if success:
+            # Convert to date object
+            upload_date = datetime.datetime.strptime(upload_date_str, "%Y%m%d").date()
+            
+            # Simple check: is it today or yesterday?
+            print(f"Checking {title} - Date: {upload_date} vs Threshold: {yesterday}")
+            if upload_date >= yesterday:
+                print(f"Found new YouTube video candidate: {title} ({upload_date})")
+                # Process
+                job = processor.VideoJob(
+                    url=url, 
+                    platform="youtube",
+                    uploader_name=uploader_name,
+                    title=title,
+                    video_id=video_id
+                )
+                if pipeline:
+                    pipeline.submit(job)
+                    found_count += 1
+                    # Result comes later; check it again next poll
+                    unsettled.add(video_id)
+                else:
+                    processor.process_videos([job])
+                    if job.success:
                         processed_count += 1
+                    else:
+                        unsettled.add(video_id)
+
+        # Move the watermark to the newest entry that has nothing unsettled
+        # before it (in scan order) so failed or pending videos are re-checked.
+        new_watermark = entries[0]
+        for i, entry in enumerate(entries):
+            if entry['id'] in unsettled:
+                new_watermark = entries[i + 1] if i + 1 < len(entries) else None
+        if new_watermark:
+            database.set_watermark(channel_url, new_watermark['id'], new_watermark.get('timestamp'))
                         
-        if processed_count > 0:
+        if found_count > 0:
+            print(f"Queued {found_count} new YouTube videos.")
+        elif processed_count > 0:
             print(f"Processed {processed_count} new YouTube videos.")
         else:
             print("No new YouTube videos found.")
@@ -209,13 +357,206 @@ def check_youtube_new_videos(channel_url):
     except Exception as e:
         print(f"Error checking YouTube: {e}")
 
-async def main_monitor():
-    await check_new_videos(BILIBILI_UID)
-    # YouTube check is blocking (sync), so just call it
+async def check_channel(channel, semaphore, executor, pipeline=None):
+    async with semaphore:
+        with metrics.timer("channel_check", platform=channel["platform"]):
+            if channel["platform"] == "bilibili":
+                await check_new_videos(int(channel["uid"]), executor, pipeline)
+            else:
+                # YouTube check is blocking (yt-dlp), run it in the thread pool
+                loop = asyncio.get_running_loop()
+                await loop.run_in_executor(executor, check_youtube_new_videos, channel["url"], pipeline)
+
+async def main_monitor(config_path=CHANNELS_FILE, concurrency=None):
+    channels, file_concurrency = load_channels(config_path)
+    concurrency = concurrency or file_concurrency or int(os.getenv("MONITOR_CONCURRENCY", DEFAULT_CONCURRENCY))
+    concurrency = max(1, int(concurrency))
+    print(f"Checking {len(channels)} channels (concurrency: {concurrency})")
+
+    start = time.time()
+    semaphore = asyncio.Semaphore(concurrency)
+    # New videos from every channel go through one shared processing pipeline,
+    # so processing overlaps with checking the remaining channels.
+    pipeline = processor.build_pipeline().start()
+    loop = asyncio.get_running_loop()
+    # One bulk Notion query up front, dedup checks are then local lookups
+    await loop.run_in_executor(None, notion_publisher.load_notion_index)
+    # Videos an earlier run did not finish continue where they stopped
+    await loop.run_in_executor(None, _resume_unfinished, pipeline)
+    # Leave room in the pool for Bilibili checks handing jobs to the pipeline
+    with ThreadPoolExecutor(max_workers=concurrency * 2) as executor:
+        results = await asyncio.gather(
+            *(check_channel(ch, semaphore, executor, pipeline) for ch in channels),
+            return_exceptions=True
+        )
+        jobs = await loop.run_in_executor(executor, pipeline.close)
+
+    for ch, result in zip(channels, results):
+        if isinstance(result, Exception):
+            print(f"Error checking channel {ch.get('name') or ch.get('uid') or ch.get('url')}: {result}")
+
+    processed = sum(1 for job in jobs if job.status == "done")
+    failed = sum(1 for job in jobs if job.status == "failed")
     print("-" * 20)
-    check_youtube_new_videos(YOUTUBE_CHANNEL)
+    print(f"Checked {len(channels)} channels in {time.time() - start:.1f}s. "
+          f"Processed {processed} new videos ({failed} failed).")
+    metrics.print_summary()
+
+class _InFlightFilter:
+    """
+    Stands in for the pipeline in --daemon mode, so a video that is still
+    being processed is not queued again by the next poll of its channel.
+    """
+    def __init__(self, pipeline):
+        self.pipeline = pipeline
+        self._ids = set()
+        self._lock = threading.Lock()
+
+    def submit(self, job):
+        key = job.video_id or job.url
+        with self._lock:
+            if key in self._ids:
+                return
+            self._ids.add(key)
+        self.pipeline.submit(job)
+
+    def done(self, job):
+        with self._lock:
+            self._ids.discard(job.video_id or job.url)
+
+def _resume_unfinished(pipeline):
+    """
+    Submits the jobs earlier runs left unfinished.
+    """
+    jobs = processor.resume_jobs()
+    if jobs:
+        print(f"Resuming {len(jobs)} unfinished videos from earlier runs.")
+    for job in jobs:
+        pipeline.submit(job)
+
+def _channel_name(channel):
+    return channel.get("name") or channel.get("uid") or channel.get("url")
+
+async def _wait(stop, seconds):
+    """
+    Sleeps for seconds, or until stop is set. Returns True if stopped.
+    """
+    try:
+        await asyncio.wait_for(stop.wait(), timeout=max(0, seconds))
+        return True
+    except asyncio.TimeoutError:
+        return False
+
+def _jittered(seconds):
+    return seconds * random.uniform(1 - JITTER, 1 + JITTER)
+
+async def poll_channel(channel, semaphore, executor, pipeline, stop, interval, metrics_path=None):
+    """
+    Checks one channel every `interval` seconds (with jitter) until stop is set.
+    A check that is already running is finished before returning.
+    """
+    interval = float(channel.get("interval") or interval)
+    # Spread the first checks out so channels don't all poll at the same moment
+    if await _wait(stop, random.uniform(0, min(interval, 60) * JITTER)):
+        return
+    while True:
+        try:
+            await check_channel(channel, semaphore, executor, pipeline)
+        except Exception as e:
+            print(f"Error checking channel {_channel_name(channel)}: {e}")
+        if metrics_path:
+            metrics.write_report(metrics_path)
+        if await _wait(stop, _jittered(interval)):
+            return
+
+async def refresh_notion(executor, stop):
+    """
+    Keeps the Notion URL index current with pages added by other runs.
+    """
+    loop = asyncio.get_running_loop()
+    while not await _wait(stop, _jittered(NOTION_REFRESH_INTERVAL)):
+        await loop.run_in_executor(executor, notion_publisher.refresh_notion_index)
+
+def _install_signal_handlers(stop):
+    """
+    First SIGTERM/SIGINT: stop polling and drain in-flight work. Second one: exit now.
+    """
+    loop = asyncio.get_running_loop()
+
+    def handle(signum, frame=None):
+        if stop.is_set():
+            print("Second signal, exiting without draining.")
+            os._exit(1)
+        print(f"Received {signal.Signals(signum).name}, finishing in-flight work...")
+        stop.set()
+
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        try:
+            loop.add_signal_handler(signum, handle, signum)
+        except (NotImplementedError, RuntimeError):
+            # Windows: no loop signal handlers
+            signal.signal(signum, lambda s, f: loop.call_soon_threadsafe(handle, s))
+
+async def run_daemon(config_path=CHANNELS_FILE, concurrency=None, interval=None, metrics_path=None):
+    """
+    Polls every channel on its own interval until SIGTERM/SIGINT. One
+    pipeline, thread pool, Notion index and set of clients and DB/cache
+    connections are kept for the whole run instead of being rebuilt per check.
+    """
+    channels, file_concurrency = load_channels(config_path)
+    concurrency = concurrency or file_concurrency or int(os.getenv("MONITOR_CONCURRENCY", DEFAULT_CONCURRENCY))
+    concurrency = max(1, int(concurrency))
+    interval = interval or DEFAULT_INTERVAL
+    print(f"Monitoring {len(channels)} channels (concurrency: {concurrency}, default interval: {interval}s)")
+
+    stop = asyncio.Event()
+    _install_signal_handlers(stop)
+
+    counts = {"done": 0, "failed": 0, "skipped": 0}
+
+    def on_done(job):
+        counts[job.status] = counts.get(job.status, 0) + 1
+        in_flight.done(job)
+
+    start = time.time()
+    semaphore = asyncio.Semaphore(concurrency)
+    pipeline = processor.build_pipeline(on_done=on_done, keep_results=False).start()
+    in_flight = _InFlightFilter(pipeline)
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(None, notion_publisher.load_notion_index)
+    await loop.run_in_executor(None, _resume_unfinished, in_flight)
+    with ThreadPoolExecutor(max_workers=concurrency * 2) as executor:
+        await asyncio.gather(
+            refresh_notion(executor, stop),
+            *(poll_channel(ch, semaphore, executor, in_flight, stop, interval, metrics_path) for ch in channels)
+        )
+        # Every poller has returned; let queued videos finish
+        print("Polling stopped. Draining the processing pipeline...")
+        await loop.run_in_executor(executor, pipeline.close)
+
+    print("-" * 20)
+    print(f"Monitor ran for {(time.time() - start) / 3600:.1f}h. "
+          f"Processed {counts['done']} new videos ({counts['failed']} failed).")
+    metrics.print_summary()
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Channel monitor")
+    parser.add_argument("--config", default=CHANNELS_FILE, help="Channel list file (.json, .toml, .yaml)")
+    parser.add_argument("--concurrency", type=int, default=None, help="Max channels checked at the same time")
+    parser.add_argument("--metrics", default=os.getenv("METRICS_FILE"),
+                        help="Write run metrics to this file (Prometheus text for .prom, JSON otherwise)")
+    parser.add_argument("--daemon", action="store_true",
+                        help="Keep running and poll each channel on its own interval until SIGTERM")
+    parser.add_argument("--interval", type=int, default=None,
+                        help=f"--daemon: default seconds between polls of a channel (default: {DEFAULT_INTERVAL})")
+    args = parser.parse_args()
+
+    setup()
     # Run the async loop
-    asyncio.run(main_monitor())
+    if args.daemon:
+        asyncio.run(run_daemon(args.config, args.concurrency, args.interval, args.metrics))
+    else:
+        asyncio.run(main_monitor(args.config, args.concurrency))
+    if args.metrics:
+        metrics.write_report(args.metrics)
 
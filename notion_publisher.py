@@ -1,30 +1,148 @@
 import os
-from notion_client import Client
-from dotenv import load_dotenv
 import time
+import re
+import json
+import threading
+import datetime
+import metrics
+import ratelimit
+from clients import get_http_session
 
-load_dotenv()
+NOTION_VERSION = "2022-06-28"
+API_BASE = os.getenv("NOTION_API_BASE", "https://api.notion.com/v1")
 
-NOTION_TOKEN = os.getenv("NOTION_API_KEY")
-DATABASE_ID = os.getenv("NOTION_DATABASE_ID")
+# Notion request limits: 100 blocks per children array, 2000 characters per
+# rich text object, 100 rich text objects per block, 500KB per payload.
+MAX_BLOCKS_PER_REQUEST = 100
+MAX_TEXT_LENGTH = 2000
+MAX_RICH_TEXT_ITEMS = 100
+# Stay well under the 500KB payload limit
+MAX_PAYLOAD_BYTES = 400 * 1000
+# Pages published at the same time by the background publish queue
+PUBLISH_WORKERS = int(os.getenv("NOTION_PUBLISH_WORKERS", 2))
 
-import requests
+# Read on use rather than at import, so .env loaded by the entry script applies
+def _token():
+    return os.getenv("NOTION_API_KEY")
+
+def _database_id():
+    return os.getenv("NOTION_DATABASE_ID")
+
+# URLs of pages already in the Notion database, loaded once per run with a
+# paginated bulk query and then refreshed with only recently edited pages.
+_url_index = set()
+_index_synced_at = None
+_url_property_id = None
+_index_lock = threading.RLock()
+
+def _headers():
+    return {
+        "Authorization": f"Bearer {_token()}",
+        "Notion-Version": NOTION_VERSION,
+        "Content-Type": "application/json"
+    }
+
+def _get_url_property_id():
+    """
+    Looks up the id of the 'URL' property so bulk queries only return that column.
+    """
+    global _url_property_id
+    if _url_property_id is None:
+        try:
+            response = ratelimit.call("notion", lambda: get_http_session().get(f"{API_BASE}/databases/{_database_id()}", headers=_headers()))
+            if response.status_code == 200:
+                prop = response.json().get("properties", {}).get("URL", {})
+                _url_property_id = prop.get("id", "")
+        except Exception as e:
+            print(f"Error reading Notion database schema: {e}")
+    return _url_property_id or None
+
+def load_notion_index(full=False):
+    """
+    Fetches the URL of every page in the Notion Database into the in-memory index.
+    After the first load only pages edited since the last sync are fetched,
+    unless full=True. Returns True on success.
+    """
+    global _index_synced_at
+    if not _token() or not _database_id():
+        return False
+
+    with _index_lock:
+        # last_edited_time is rounded to the minute, so look back a little
+        sync_start = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(minutes=2)
+        incremental = _index_synced_at is not None and not full
+
+        api_url = f"{API_BASE}/databases/{_database_id()}/query"
+        params = {}
+        property_id = _get_url_property_id()
+        if property_id:
+            params["filter_properties"] = property_id
+
+        payload = {"page_size": 100}
+        if incremental:
+            payload["filter"] = {
+                "timestamp": "last_edited_time",
+                "last_edited_time": {"on_or_after": _index_synced_at}
+            }
+
+        try:
+            urls = set()
+            pages = 0
+            while True:
+                with metrics.timer("notion_request", op="index"):
+                    response = ratelimit.call("notion", lambda: get_http_session().post(api_url, headers=_headers(), params=params, json=payload))
+                if response.status_code != 200:
+                    print(f"Notion API Error: {response.text}")
+                    return False
+
+                data = response.json()
+                for page in data.get("results", []):
+                    url = page.get("properties", {}).get("URL", {}).get("url")
+                    if url:
+                        urls.add(url)
+                pages += 1
+
+                if not data.get("has_more"):
+                    break
+                payload["start_cursor"] = data.get("next_cursor")
+
+            if not incremental:
+                _url_index.clear()
+            _url_index.update(urls)
+            _index_synced_at = sync_start.isoformat()
+            print(f"Notion index {'refreshed' if incremental else 'loaded'}: {len(urls)} URLs in {pages} requests ({len(_url_index)} total).")
+            return True
+        except Exception as e:
+            print(f"Error querying Notion: {e}")
+            return False
+
+def refresh_notion_index():
+    """
+    Adds pages edited since the last sync to the index.
+    """
+    return load_notion_index(full=False)
 
 def is_video_processed_notion(url):
     """
     Checks if a video URL already exists in the Notion Database.
-    We use the 'URL' property for this check.
+    We use the 'URL' property for this check. The index is loaded on first use.
     """
-    if not NOTION_TOKEN or not DATABASE_ID:
+    if not _token() or not _database_id():
         return False
-        
+
+    with _index_lock:
+        loaded = _index_synced_at is not None or load_notion_index()
+    if not loaded:
+        return _query_video_url(url)
+
+    return url in _url_index
+
+def _query_video_url(url):
+    """
+    Single-URL query, used only when the bulk index could not be loaded.
+    """
     try:
-        api_url = f"https://api.notion.com/v1/databases/{DATABASE_ID}/query"
-        headers = {
-            "Authorization": f"Bearer {NOTION_TOKEN}",
-            "Notion-Version": "2022-06-28",
-            "Content-Type": "application/json"
-        }
+        api_url = f"{API_BASE}/databases/{_database_id()}/query"
         payload = {
             "filter": {
                 "property": "URL",
@@ -34,7 +152,8 @@ def is_video_processed_notion(url):
             }
         }
         
-        response = requests.post(api_url, headers=headers, json=payload)
+        with metrics.timer("notion_request", op="query"):
+            response = ratelimit.call("notion", lambda: get_http_session().post(api_url, headers=_headers(), json=payload))
         
         if response.status_code != 200:
             print(f"Notion API Error: {response.text}")
@@ -47,39 +166,147 @@ def is_video_processed_notion(url):
         print(f"Error querying Notion: {e}")
         return False
 
+def _rich_text(text):
+    """
+    Notion rich text for one line of markdown: **bold** and `code` become
+    annotations, long runs are split into MAX_TEXT_LENGTH pieces.
+    """
+    items = []
+    for part in re.split(r'(\*\*[^*]+\*\*|`[^`]+`)', text):
+        if not part:
+            continue
+        annotations = {}
+        if part.startswith("**") and part.endswith("**") and len(part) > 4:
+            part = part[2:-2]
+            annotations["bold"] = True
+        elif part.startswith("`") and part.endswith("`") and len(part) > 2:
+            part = part[1:-1]
+            annotations["code"] = True
+        for i in range(0, len(part), MAX_TEXT_LENGTH):
+            item = {"type": "text", "text": {"content": part[i:i+MAX_TEXT_LENGTH]}}
+            if annotations:
+                item["annotations"] = annotations
+            items.append(item)
+    return items
+
+def _text_blocks(block_type, text, **extra):
+    """
+    One block of block_type, or several if the text needs more than
+    MAX_RICH_TEXT_ITEMS rich text objects.
+    """
+    rich_text = _rich_text(text)
+    blocks = []
+    for i in range(0, max(1, len(rich_text)), MAX_RICH_TEXT_ITEMS):
+        blocks.append({
+            "object": "block",
+            "type": block_type,
+            block_type: {"rich_text": rich_text[i:i+MAX_RICH_TEXT_ITEMS], **extra}
+        })
+    return blocks
+
+def markdown_to_blocks(text):
+    """
+    Converts a markdown summary to Notion blocks: headings, bulleted and
+    numbered lists, quotes, dividers and code fences map to native blocks,
+    everything else becomes paragraphs (one per run of non-empty lines).
+    """
+    blocks = []
+    paragraph = []
+    code = None
+
+    def flush_paragraph():
+        if paragraph:
+            blocks.extend(_text_blocks("paragraph", "\n".join(paragraph)))
+            paragraph.clear()
+
+    for line in text.splitlines():
+        stripped = line.strip()
+
+        if code is not None:
+            if stripped.startswith("```"):
+                blocks.extend(_text_blocks("code", "\n".join(code), language="plain text"))
+                code = None
+            else:
+                code.append(line)
+            continue
+        if stripped.startswith("```"):
+            flush_paragraph()
+            code = []
+            continue
+
+        heading = re.match(r'(#{1,6})\s+(.*)', stripped)
+        bullet = re.match(r'[-*+]\s+(.*)', stripped)
+        numbered = re.match(r'\d+[.)]\s+(.*)', stripped)
+
+        if not stripped:
+            flush_paragraph()
+        elif re.fullmatch(r'(-{3,}|\*{3,}|_{3,})', stripped):
+            flush_paragraph()
+            blocks.append({"object": "block", "type": "divider", "divider": {}})
+        elif heading:
+            flush_paragraph()
+            # Notion has three heading levels
+            level = min(len(heading.group(1)), 3)
+            blocks.extend(_text_blocks(f"heading_{level}", heading.group(2).strip("# ")))
+        elif bullet:
+            flush_paragraph()
+            blocks.extend(_text_blocks("bulleted_list_item", bullet.group(1)))
+        elif numbered:
+            flush_paragraph()
+            blocks.extend(_text_blocks("numbered_list_item", numbered.group(1)))
+        elif stripped.startswith(">"):
+            flush_paragraph()
+            blocks.extend(_text_blocks("quote", stripped.lstrip("> ")))
+        else:
+            paragraph.append(stripped)
+
+    if code is not None:
+        blocks.extend(_text_blocks("code", "\n".join(code), language="plain text"))
+    flush_paragraph()
+    return blocks
+
+def batch_blocks(blocks):
+    """
+    Splits blocks into request-sized batches (block count and payload size).
+    """
+    batches = []
+    current = []
+    current_bytes = 0
+    for block in blocks:
+        size = len(json.dumps(block, ensure_ascii=False).encode("utf-8"))
+        if current and (len(current) >= MAX_BLOCKS_PER_REQUEST or current_bytes + size > MAX_PAYLOAD_BYTES):
+            batches.append(current)
+            current = []
+            current_bytes = 0
+        current.append(block)
+        current_bytes += size
+    if current:
+        batches.append(current)
+    return batches
+
+def _archive_page(page_id):
+    """
+    Removes a half-written page, so the video is published again next time.
+    """
+    try:
+        ratelimit.call("notion", lambda: get_http_session().patch(
+            f"{API_BASE}/pages/{page_id}", headers=_headers(), json={"archived": True}
+        ))
+    except Exception as e:
+        print(f"Error archiving incomplete Notion page {page_id}: {e}")
+
 def publish_to_notion(title, url, platform, summary_text, publish_date_str=None):
     """
     Creates a new page in the Notion Database.
+    The page is created with the first batch of blocks; the rest are appended
+    in order. A page that could not be completed is archived again.
+    Returns the new page's id (True if Notion sent none), or False.
     """
-    if not NOTION_TOKEN or not DATABASE_ID:
+    if not _token() or not _database_id():
         print("Notion credentials missing.")
         return False
 
-    # Notion limits text blocks to 2000 chars. Need to chunk summary.
-    # But usually inside a page we can just add paragraph blocks.
-    
-    # Chunking function
-    def chunk_text(text, length=2000):
-        return [text[i:i+length] for i in range(0, len(text), length)]
-
-    children_blocks = []
-    
-    # Add summary as paragraphs
-    for chunk in chunk_text(summary_text):
-        children_blocks.append({
-            "object": "block",
-            "type": "paragraph",
-            "paragraph": {
-                "rich_text": [
-                    {
-                        "type": "text",
-                        "text": {
-                            "content": chunk
-                        }
-                    }
-                ]
-            }
-        })
+    batches = batch_blocks(markdown_to_blocks(summary_text))
 
     try:
         if not publish_date_str:
@@ -92,27 +319,63 @@ def publish_to_notion(title, url, platform, summary_text, publish_date_str=None)
             "Date": {"date": {"start": publish_date_str}}
         }
         
-        api_url = "https://api.notion.com/v1/pages"
-        headers = {
-            "Authorization": f"Bearer {NOTION_TOKEN}",
-            "Notion-Version": "2022-06-28",
-            "Content-Type": "application/json"
-        }
+        api_url = f"{API_BASE}/pages"
+        headers = _headers()
         payload = {
-            "parent": {"database_id": DATABASE_ID},
+            "parent": {"database_id": _database_id()},
             "properties": new_page,
-            "children": children_blocks
+            "children": batches[0] if batches else []
         }
         
-        response = requests.post(api_url, headers=headers, json=payload)
+        with metrics.timer("notion_request", op="publish"):
+            # Not idempotent: a retried request Notion already handled would create a second page
+            response = ratelimit.call(
+                "notion", lambda: get_http_session().post(api_url, headers=headers, json=payload), idempotent=False
+            )
         
         if response.status_code != 200:
             print(f"Notion Publish Error: {response.text}")
             print("Please ensure your Notion Database has 'Name' (title), 'URL' (url), 'Platform' (select), and 'Date' (date) columns.")
             return False
-            
-        print(f"Published to Notion: {title}")
-        return True
+
+        page_id = response.json().get("id")
+        # Appends go to the end of the page, so they are sent one after another
+        append_url = f"{API_BASE}/blocks/{page_id}/children"
+        try:
+            for batch in batches[1:]:
+                with metrics.timer("notion_request", op="append"):
+                    response = ratelimit.call(
+                        "notion", lambda: get_http_session().patch(append_url, headers=headers, json={"children": batch}),
+                        idempotent=False
+                    )
+                if response.status_code != 200:
+                    print(f"Notion Append Error: {response.text}")
+                    _archive_page(page_id)
+                    return False
+        except Exception as e:
+            # A half-written page would still count as published in the dedup index
+            print(f"Notion Append Error: {e}")
+            _archive_page(page_id)
+            return False
+
+        _url_index.add(url)
+        print(f"Published to Notion: {title} ({len(batches)} requests)")
+        return page_id or True
     except Exception as e:
         print(f"Error publishing to Notion: {e}")
         return False
+
+_publish_executor = None
+
+def publish_async(title, url, platform, summary_text, publish_date_str=None):
+    """
+    Queues publish_to_notion on the background publish workers.
+    Returns a Future with its result.
+    """
+    global _publish_executor
+    if _publish_executor is None:
+        with _index_lock:
+            if _publish_executor is None:
+                from concurrent.futures import ThreadPoolExecutor
+                _publish_executor = ThreadPoolExecutor(max_workers=PUBLISH_WORKERS, thread_name_prefix="notion-publish")
+    return _publish_executor.submit(publish_to_notion, title, url, platform, summary_text, publish_date_str)
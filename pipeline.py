@@ -0,0 +1,194 @@
+import queue
+import threading
+import time
+import metrics
+
+# Default size of the queue in front of each stage. Small on purpose:
+# a full queue blocks the stage before it (backpressure).
+DEFAULT_QUEUE_SIZE = 4
+
+_STOP = object()
+
+
+class Stage:
+    """
+    One step of a pipeline.
+    func(job) returns True to hand the job to the next stage, or False when the
+    job is finished early (skipped or failed). Exceptions mark the job as failed.
+    func can also return a concurrent.futures.Future for work it handed off
+    (e.g. to a background queue): the worker is free at once, and the job moves
+    on when the future completes, or fails if the future raises.
+    """
+    def __init__(self, name, func, workers=1, queue_size=None):
+        self.name = name
+        self.func = func
+        self.workers = max(1, int(workers))
+        self.queue_size = queue_size
+
+
+class Pipeline:
+    """
+    Runs jobs through a list of stages. Every stage has its own bounded input
+    queue and worker threads, so different jobs can be in different stages at
+    the same time (job N+1 extracting while job N is summarizing).
+
+    Jobs are plain objects; the pipeline sets `job.stage` before each stage,
+    `job.status`/`job.error` when a stage raises, and `job.status = "done"`
+    when a job passes the last stage. If a job has a `timings` dict, the
+    seconds spent in each stage are stored in it by stage name; they are
+    also recorded in `metrics` as the "stage" timer.
+    """
+    def __init__(self, stages, queue_size=DEFAULT_QUEUE_SIZE, on_done=None, keep_results=True):
+        self.stages = stages
+        self.on_done = on_done
+        # Long-running pipelines pass keep_results=False and use on_done,
+        # so finished jobs are not kept around forever
+        self.keep_results = keep_results
+        self._queues = [queue.Queue(maxsize=stage.queue_size or queue_size) for stage in stages]
+        self._threads = []
+        self._finished = []
+        self._lock = threading.Lock()
+        # Jobs per stage waiting on a Future returned by that stage
+        self._pending = [0] * len(stages)
+        self._pending_done = threading.Condition(self._lock)
+        self._started = False
+        self._closed = False
+
+    def start(self):
+        if self._started:
+            return self
+        self._started = True
+        for index, stage in enumerate(self.stages):
+            workers = []
+            for n in range(stage.workers):
+                t = threading.Thread(
+                    target=self._worker,
+                    args=(index,),
+                    name=f"pipeline-{stage.name}-{n}",
+                    daemon=True
+                )
+                t.start()
+                workers.append(t)
+            self._threads.append(workers)
+        return self
+
+    def submit(self, job):
+        """
+        Adds a job to the first stage. Blocks while that stage's queue is full.
+        """
+        if self._closed:
+            raise RuntimeError("Pipeline is closed")
+        if not self._started:
+            self.start()
+        self._queues[0].put(job)
+
+    def close(self):
+        """
+        Stops accepting jobs, waits for every queued job to finish and returns
+        the finished jobs.
+        """
+        if self._closed:
+            return self.results()
+        self._closed = True
+        if not self._started:
+            return self.results()
+        # Stop the stages front to back so nothing is left in a queue
+        for index, stage in enumerate(self.stages):
+            for _ in range(stage.workers):
+                self._queues[index].put(_STOP)
+            for t in self._threads[index]:
+                t.join()
+            with self._pending_done:
+                while self._pending[index]:
+                    self._pending_done.wait()
+        return self.results()
+
+    def run(self, jobs):
+        """
+        Convenience helper: start, submit all jobs, wait for them.
+        """
+        self.start()
+        for job in jobs:
+            self.submit(job)
+        return self.close()
+
+    def results(self):
+        with self._lock:
+            return list(self._finished)
+
+    def _worker(self, index):
+        stage = self.stages[index]
+        in_queue = self._queues[index]
+
+        while True:
+            job = in_queue.get()
+            if job is _STOP:
+                break
+
+            job.stage = stage.name
+            start = time.perf_counter()
+            try:
+                keep_going = stage.func(job)
+            except Exception as e:
+                keep_going = self._fail(job, stage, e)
+
+            # A concurrent.futures.Future (checked by duck typing, importing
+            # concurrent.futures here would slow down startup)
+            if hasattr(keep_going, "add_done_callback"):
+                with self._lock:
+                    self._pending[index] += 1
+                keep_going.add_done_callback(
+                    lambda future, job=job, start=start: self._resolve(index, job, future, start)
+                )
+                continue
+
+            self._advance(index, job, keep_going, start)
+
+    def _fail(self, job, stage, error):
+        print(f"Stage '{stage.name}' failed: {error}")
+        job.status = "failed"
+        job.error = f"{stage.name}: {error}"
+        return False
+
+    def _resolve(self, index, job, future, start):
+        """
+        Moves on a job whose stage returned a Future, once it is done.
+        """
+        try:
+            future.result()
+            keep_going = True
+        except Exception as e:
+            keep_going = self._fail(job, self.stages[index], e)
+        try:
+            self._advance(index, job, keep_going, start)
+        finally:
+            with self._pending_done:
+                self._pending[index] -= 1
+                self._pending_done.notify_all()
+
+    def _advance(self, index, job, keep_going, start):
+        stage = self.stages[index]
+        elapsed = time.perf_counter() - start
+        metrics.observe("stage", elapsed, stage=stage.name)
+        timings = getattr(job, "timings", None)
+        if timings is not None:
+            timings[stage.name] = elapsed
+
+        if keep_going and index < len(self.stages) - 1:
+            self._queues[index + 1].put(job)
+            return
+
+        if keep_going:
+            job.status = "done"
+        self._finish(job)
+
+    def _finish(self, job):
+        metrics.incr("jobs", status=getattr(job, "status", None))
+        if self.keep_results:
+            with self._lock:
+                self._finished.append(job)
+        if self.on_done:
+            try:
+                self.on_done(job)
+            except Exception as e:
+                print(f"Pipeline on_done callback failed: {e}")
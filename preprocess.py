@@ -0,0 +1,141 @@
+import os
+import re
+import time
+import metrics
+from transcript import Transcript
+
+# Cleans transcripts before they are summarized, so fewer tokens are sent:
+# rolling caption overlaps, repeated lines and phrases (Whisper loops), sound
+# tags, fillers, timestamps and noisy punctuation are removed.
+# Set TRANSCRIPT_PREPROCESS=0 to send transcripts unchanged.
+ENABLED = os.getenv("TRANSCRIPT_PREPROCESS", "1") != "0"
+
+# A caption line repeating the end of the previous one must share at least
+# this many words (CJK characters count as words) to be cut. Rolling
+# auto-captions (lines overlapping in time) repeat the previous line by
+# design, so a short repeat is enough there; sequential Bilibili and Whisper
+# segments need a long one, as short repeats there are real speech.
+ROLLING_MIN_OVERLAP_TOKENS = 2
+MIN_OVERLAP_TOKENS = 8
+# Words of the previous line compared against the start of the next one
+OVERLAP_WINDOW = 40
+
+_TOKEN_RE = re.compile(r'[\u4e00-\u9fff]|[^\s\u4e00-\u9fff]+')
+# Caption sound tags: [Music], [音乐], (applause), (upbeat music), (笑) ...
+# Only these words, other bracketed text (tickers like (AAPL), figures) is kept
+_SOUND_WORDS = "music|applause|laughter|laughs|laughing|cheering|cheers|silence|noise|inaudible|foreign|sound effects?|音乐|掌声|鼓掌|笑声|笑|欢呼|音效"
+_SOUND_TAG_RE = re.compile(r'(?i)[\[(（【]\s*(?:[a-z]+ ){0,2}(?:' + _SOUND_WORDS + r')\s*[\])）】]')
+# SRT/VTT cue timings ("00:01:02,000 --> 00:01:05,000"); a bare time like
+# "10:30" is spoken content and stays
+_TIMESTAMP_RE = re.compile(r'^\s*\d{1,2}:\d{2}(?::\d{2})?(?:[.,]\d+)?\s*-->\s*\d{1,2}:\d{2}(?::\d{2})?(?:[.,]\d+)?\s*')
+_BRACKETED_TIMESTAMP_RE = re.compile(r'[\[(<]\d{1,2}:\d{2}(?::\d{2})?(?:[.,]\d+)?[\])>]')
+_FILLER_RE = re.compile(r'(?i)(?<![\w])(?:um+|uh+|erm+|hmm+|uh-huh)(?![\w])[,，]?|[嗯呃]+[，,]?')
+# Whole words or phrases (two or more characters) repeated three or more times
+# in a row with separators between them, e.g. Whisper loops. Letters within a
+# word are never collapsed, so tickers and ratings like BBBY or AAA stay intact.
+_REPEAT_WORDS_RE = re.compile(r'\b([^\W\d_][^\n]{1,48}?)\b(?:[\s,，.。!！?？、]+\1\b){2,}')
+# CJK phrases of two or more characters repeat without separators
+_REPEAT_CJK_RE = re.compile(r'([\u4e00-\u9fff][^\n]{1,48}?)(?:[\s,，.。!！?？、]*\1){2,}')
+_PUNCT_RUN_RE = re.compile(r'([，。！？、,!?;；])\1+')
+_SPACE_BEFORE_PUNCT_RE = re.compile(r'\s+([，。！？、；：,!?;:])')
+
+_NON_WORD_RE = re.compile(r'[^\w]')
+
+def clean_text(text):
+    """
+    Removes sound tags, fillers, timestamps and repeated phrases from one
+    piece of text and tidies its whitespace and punctuation.
+    """
+    text = text.replace("\u3000", " ")
+    text = _TIMESTAMP_RE.sub("", text)
+    text = _BRACKETED_TIMESTAMP_RE.sub("", text)
+    text = _SOUND_TAG_RE.sub(" ", text)
+    text = _FILLER_RE.sub(" ", text)
+    text = _REPEAT_WORDS_RE.sub(r"\1", text)
+    text = _REPEAT_CJK_RE.sub(r"\1", text)
+    text = " ".join(text.split())
+    text = _SPACE_BEFORE_PUNCT_RE.sub(r"\1", text)
+    text = _PUNCT_RUN_RE.sub(r"\1", text)
+    return text.strip(" ,，")
+
+def _overlap(prev_tokens, tokens, min_tokens):
+    """
+    Number of leading tokens of `tokens` (at least min_tokens) that repeat
+    the end of `prev_tokens`.
+    """
+    limit = min(len(prev_tokens), len(tokens))
+    for n in range(limit, min_tokens - 1, -1):
+        if prev_tokens[-n:] == tokens[:n]:
+            return n
+    return 0
+
+def dedupe_segments(segments):
+    """
+    Drops repeated caption lines and the part of each line that repeats the
+    end of the line before it (rolling auto-captions). Yields (start, end, text).
+    """
+    prev = None
+    prev_tokens = []
+    for start, end, text in segments:
+        matches = []
+        tokens = []
+        for m in _TOKEN_RE.finditer(text):
+            token = _NON_WORD_RE.sub("", m.group()).lower()
+            if token:
+                matches.append(m)
+                tokens.append(token)
+        if not tokens:
+            continue
+
+        rolling = prev is not None and start < prev[1]
+        min_tokens = ROLLING_MIN_OVERLAP_TOKENS if rolling else MIN_OVERLAP_TOKENS
+        n = _overlap(prev_tokens, tokens, min_tokens)
+        repeated = len(tokens) >= min_tokens and tokens == prev_tokens[-len(tokens):]
+        if prev is not None and (n == len(tokens) or repeated):
+            # Nothing new in this line, it only extends the previous one
+            prev = (prev[0], max(prev[1], end), prev[2])
+            continue
+        if n:
+            text = text[matches[n].start():]
+            tokens = tokens[n:]
+
+        if prev is not None:
+            yield prev
+        prev = (start, end, text)
+        prev_tokens = (prev_tokens + tokens)[-OVERLAP_WINDOW:]
+    if prev is not None:
+        yield prev
+
+def preprocess_transcript(transcript):
+    """
+    Returns a cleaned copy of a Transcript (or text). Timings are kept.
+    """
+    if not isinstance(transcript, Transcript):
+        transcript = Transcript.from_text(transcript)
+
+    cleaned = ((start, end, clean_text(text)) for start, end, text in transcript)
+    result = Transcript.from_segments(dedupe_segments(s for s in cleaned if s[2]))
+    result.timed = transcript.timed
+    return result
+
+def preprocess(transcript, label=""):
+    """
+    Cleans a transcript for summarization and logs the token reduction.
+    Returns the transcript unchanged if preprocessing is disabled.
+    """
+    if not ENABLED or not transcript:
+        return transcript
+
+    from summarizer import count_tokens
+
+    start = time.perf_counter()
+    cleaned = preprocess_transcript(transcript)
+    before = count_tokens(str(transcript))
+    after = count_tokens(cleaned.text)
+    metrics.observe("preprocess", time.perf_counter() - start)
+    metrics.incr("transcript_tokens", before, phase="raw")
+    metrics.incr("transcript_tokens", after, phase="preprocessed")
+
+    ratio = 1 - after / before if before else 0
+    print(f"Preprocessed transcript{' ' + label if label else ''}: {before} -> {after} tokens ({ratio:.1%} fewer)")
+    return cleaned
@@ -1,120 +1,397 @@
 import os
 import re
 import time
-from extractors import youtube, bilibili
-from summarizer import summarize
-from audio_handler import process_video_audio
+import socket
 import database
 import notion_publisher
+import extractors
+import metrics
+import preprocess
+from pipeline import Pipeline, Stage, DEFAULT_QUEUE_SIZE
+from transcript import as_text
+
+# Worker threads per stage. Extraction and summarization are the slow,
+# network-bound steps, so they get more workers by default.
+# Override with PIPELINE_WORKERS="extract=4,summarize=3".
+STAGE_WORKERS = {
+    "check": 1,
+    "extract": 2,
+    "preprocess": 1,
+    "summarize": 2,
+    "save": 1,
+    "publish": 1,
+    "record": 1,
+}
+
+# Owner name for job leases in the database; unique per run
+WORKER_ID = os.getenv("WORKER_ID") or f"{socket.gethostname()}:{os.getpid()}:{os.urandom(3).hex()}"
 
 def sanitize_filename(name):
     return re.sub(r'[^\w\-_ \u4e00-\u9fa5]', '_', name).strip()
 
-def process_video(url, platform=None, uploader_name="Unknown", title=None, video_id=None, distinct_folder=True):
+class VideoJob:
     """
-    Main processing logic.
-    distinct_folder: If True, saves to output/[UploaderName]/...
+    State of one video as it moves through the processing pipeline.
     """
-    if "youtube.com" in url or "youtu.be" in url:
-        platform = "youtube"
-        extractor = youtube
-    elif "bilibili.com" in url:
-        platform = "bilibili"
-        extractor = bilibili
-    else:
-        print("Unsupported URL")
+    def __init__(self, url, platform=None, uploader_name="Unknown", title=None, video_id=None, distinct_folder=True):
+        self.url = url
+        self.platform = platform
+        self.uploader_name = uploader_name
+        self.title = title
+        self.video_id = video_id
+        self.distinct_folder = distinct_folder
+
+        self.extractor = None
+        self.transcript = None
+        # Set when a batch prefetch already found no subtitles
+        self.subtitles_missing = False
+        self.audio_used = False
+        self.summary_text = None
+        self.filepath = None
+        self.date_str = None
+        self.summary_ref = None
+        self.notion_page_id = None
+
+        # Set when this run holds the video's row in the jobs table. Stages
+        # before resume_index were finished by an earlier run.
+        self.leased = False
+        self.resume_index = 0
+
+        self.stage = None
+        self.status = "pending"
+        self.error = None
+        # Seconds per stage name, filled in by the pipeline
+        self.timings = {}
+
+    @property
+    def success(self):
+        return self.status in ("done", "skipped")
+
+    def fail(self, message):
+        print(message)
+        self.status = "failed"
+        self.error = message
         return False
 
+def _checkpoint(job, stage, **outputs):
+    """
+    Saves the outputs of a finished stage, so a later run can resume after it.
+    """
+    if job.leased:
+        database.checkpoint_job(job.video_id, WORKER_ID, stage=stage, **outputs)
+
+def _restore(job, row):
+    """
+    Puts the outputs saved by an earlier run back on the job. Returns the
+    index of the first stage left to run; stages whose outputs are gone
+    (evicted cache entry, deleted file) are run again.
+    """
+    job.title = job.title or row["title"]
+    job.audio_used = bool(row["audio_used"])
+    done = _STAGE_INDEX.get(row["stage"], 0)
+
+    if done >= _STAGE_INDEX["summarize"] and row["summary_ref"]:
+        import summary_cache
+        job.summary_text = summary_cache.get_summary(row["summary_ref"])
+        if job.summary_text:
+            job.summary_ref = row["summary_ref"]
+            if done < _STAGE_INDEX["save"] or not (row["filepath"] and os.path.exists(row["filepath"])):
+                return _STAGE_INDEX["save"]
+            job.filepath = row["filepath"]
+            job.date_str = row["date_str"]
+            if done < _STAGE_INDEX["publish"] or not row["notion_page_id"]:
+                return _STAGE_INDEX["publish"]
+            job.notion_page_id = row["notion_page_id"]
+            return _STAGE_INDEX["record"]
+
+    if row["transcript_ref"]:
+        import transcript_cache
+        job.transcript = transcript_cache.get_transcript(job.platform, job.video_id, row["transcript_ref"])
+        if job.transcript:
+            return _STAGE_INDEX["preprocess"]
+    return _STAGE_INDEX["extract"]
+
+def _stage_check(job):
+    url = job.url
+    platform, extractor = extractors.get_extractor(url)
+    if not extractor:
+        return job.fail("Unsupported URL")
+    job.platform = platform
+    job.extractor = extractor
+
     # 1. Get Video ID (if not provided)
-    if not video_id:
-        if platform == "youtube":
-            video_id = youtube.get_video_id(url)
-        else:
-            video_id = bilibili.get_bvid(url)
-
-    # 2. Check Database (Notion & Local)
-    # Priority: Notion (for cloud persistence)
-    if notion_publisher.is_video_processed_notion(url):
-         print(f"Video {url} already in Notion. Skipping.")
-         return True
-         
-    if database.is_video_processed(video_id):
-        print(f"Video {video_id} already in local DB. Skipping.")
-        return True
-
-    print(f"Processing {url} ({platform})...")
+    if not job.video_id:
+        job.video_id = extractor.get_video_id(url)
+    if not job.video_id:
+        # Needed for deduplication and the job's row in the database
+        return job.fail(f"Could not determine the video id of {url}")
+
+    # 2. Check Database (Local & Notion)
+    # Local DB first, it is the cheapest. The Notion check is a lookup in the
+    # prefetched index (loaded on first use).
+    if database.is_video_processed(job.video_id):
+        print(f"Video {job.video_id} already in local DB. Skipping.")
+        job.status = "skipped"
+        database.finish_job(job.video_id, "done")
+        return False
+
+    # 3. Lease the job, so no other run works on it at the same time, and
+    # pick up where an earlier (crashed) run stopped
+    row = database.claim_job(
+        job.video_id, WORKER_ID,
+        url=url, platform=job.platform, uploader_name=job.uploader_name, title=job.title
+    )
+    if row is None:
+        print(f"Video {job.video_id} is being processed by another run. Skipping.")
+        job.status = "skipped"
+        return False
+    job.leased = True
+    if row["stage"]:
+        job.resume_index = _restore(job, row)
+        print(f"Resuming {job.video_id} at stage '{STAGES[job.resume_index][0]}'.")
+
+    # Our own page from the earlier run would count as a duplicate
+    if job.resume_index < _STAGE_INDEX["record"]:
+        with metrics.timer("notion_dedup"):
+            in_notion = notion_publisher.is_video_processed_notion(url)
+        if in_notion:
+            print(f"Video {url} already in Notion. Skipping.")
+            job.status = "skipped"
+            return False
+
+    return True
+
+def _stage_extract(job):
+    print(f"Processing {job.url} ({job.platform})...")
 
     # 3. Extract Transcript
-    transcript = extractor.extract_transcript(url)
-    
+    transcript = job.transcript
+    if not transcript and not job.subtitles_missing:
+        transcript = job.extractor.extract_transcript(job.url)
+
     # 4. Fallback to Audio
-    audio_used = False
     if not transcript:
         print("Transcript not found in subtitles. Attempting audio fallback...")
-        transcript = process_video_audio(url)
-        audio_used = True
-    
+        metrics.incr("audio_fallbacks", platform=job.platform)
+        from audio_handler import process_video_audio
+        transcript = process_video_audio(job.url)
+        job.audio_used = True
+
     if not transcript:
-        print("Failed to get content from subtitles or audio.")
-        return False
+        return job.fail("Failed to get content from subtitles or audio.")
+
+    job.transcript = transcript
+    # Extractors keep the transcript in transcript_cache under its source
+    _checkpoint(job, "extract", transcript_ref="whisper" if job.audio_used else "subtitle", audio_used=job.audio_used)
+    return True
+
+def _stage_preprocess(job):
+    # Drop repeated caption lines, fillers etc. before paying for the tokens
+    job.transcript = preprocess.preprocess(job.transcript, job.video_id or job.url)
+    return True
+
+def _output_path(job):
+    """
+    Sets the job's date and title and returns the path of its summary file.
+    """
+    job.date_str = time.strftime("%Y-%m-%d")
+
+    # Create folder structure
+    safe_uploader = sanitize_filename(job.uploader_name)
+    output_dir = f"output/{safe_uploader}"
+    os.makedirs(output_dir, exist_ok=True)
+
+    if not job.title:
+        job.title = f"Video_{job.video_id}"
+
+    safe_title = sanitize_filename(job.title)
+    safe_title = safe_title[:50]
+    filename = f"{safe_title} - {job.date_str}.md"
+    return os.path.join(output_dir, filename)
+
+def _file_header(job):
+    return f"# Summary: {job.title}\n\n**URL**: {job.url}\n**Date**: {job.date_str}\n\n"
 
-    # 5. Summarize
-    print(f"Content extracted ({len(transcript)} chars). Summarizing...")
+def _stage_summarize(job):
+    # 5. Summarize, streamed straight into the output file
+    print(f"Content extracted ({len(job.transcript.text)} chars). Summarizing...")
+    filepath = _output_path(job)
     try:
-        summary_text = summarize(transcript)
+        from summarizer import summarize_to_file, get_cache_key
+        job.summary_text = summarize_to_file(job.transcript, filepath, header=_file_header(job))
+        # The summary is stored in summary_cache under this key
+        job.summary_ref = get_cache_key(as_text(job.transcript))
     except Exception as e:
-        print(f"Summarization failed: {e}")
-        return False
+        return job.fail(f"Summarization failed: {e}")
+    job.filepath = filepath
+    print(f"Summary saved to {filepath}")
+    # The transcript is not needed any more, don't keep it alive in the queue
+    job.transcript = None
+    _checkpoint(job, "summarize", summary_ref=job.summary_ref)
+    return True
 
+def _stage_save(job):
     # 6. Save Output (Local File + Notion)
-    
-    # ... (Local file saving logic) ...
-    
-    date_str = time.strftime("%Y-%m-%d")
-    
-    # Create folder structure and save file
-    safe_uploader = sanitize_filename(uploader_name)
-    output_dir = f"output/{safe_uploader}"
-    if not os.path.exists(output_dir):
-        os.makedirs(output_dir)
+    # The summarize stage already wrote the file; a job resumed with its
+    # summary from the cache gets it written here.
+    if not job.filepath:
+        filepath = _output_path(job)
+        try:
+            with metrics.timer("file_write"), open(filepath, "w", encoding="utf-8") as f:
+                f.write(_file_header(job))
+                f.write(job.summary_text)
+            print(f"Summary saved to {filepath}")
+        except Exception as e:
+            return job.fail(f"Error saving results: {e}")
+        job.filepath = filepath
 
-    if not title:
-        title = f"Video_{video_id}"
-    
-    safe_title = sanitize_filename(title)
-    safe_title = safe_title[:50]
-    filename = f"{safe_title} - {date_str}.md"
-    filepath = os.path.join(output_dir, filename)
-    
+    _checkpoint(job, "save", filepath=job.filepath, date_str=job.date_str, title=job.title)
+    return True
+
+def _stage_publish(job):
+    # 7. Record in Notion
+    # Published by notion_publisher's background workers; the pipeline moves
+    # the job on to the record stage when the returned future completes.
+    future = notion_publisher.publish_async(
+        title=job.title,
+        url=job.url,
+        platform=job.platform,
+        summary_text=job.summary_text,
+        publish_date_str=job.date_str
+    )
+
+    def on_published(future):
+        page_id = None if future.exception() else future.result()
+        if page_id:
+            job.notion_page_id = page_id if isinstance(page_id, str) else None
+            _checkpoint(job, "publish", notion_page_id=job.notion_page_id)
+
+    # Runs before the pipeline's own callback, so the checkpoint is saved
+    # before the job moves on
+    future.add_done_callback(on_published)
+    return future
+
+def _stage_record(job):
+    # 8. Record in Local DB
     try:
-        with open(filepath, "w", encoding="utf-8") as f:
-            f.write(f"# Summary: {title}\n\n")
-            f.write(f"**URL**: {url}\n")
-            f.write(f"**Date**: {date_str}\n\n")
-            f.write(summary_text)
-        print(f"Summary saved to {filepath}")
-        
-        # 7. Record in Notion
-        notion_publisher.publish_to_notion(
-            title=title,
-            url=url,
-            platform=platform,
-            summary_text=summary_text,
-            publish_date_str=date_str
-        )
-        
-        # 8. Record in Local DB
-        database.add_processed_video(
-            video_id=video_id,
-            title=title,
-            uploader_id=safe_uploader, 
-            platform=platform,
-            publish_date=int(time.time()), 
-            summary_path=filepath,
-            audio_downloaded=audio_used
-        )
-        return True
+        with metrics.timer("db_write"):
+            database.add_processed_video(
+                video_id=job.video_id,
+                title=job.title,
+                uploader_id=sanitize_filename(job.uploader_name),
+                platform=job.platform,
+                publish_date=int(time.time()),
+                summary_path=job.filepath,
+                audio_downloaded=job.audio_used
+            )
+    except Exception as e:
+        return job.fail(f"Error saving results: {e}")
+    return True
+
+STAGES = [
+    ("check", _stage_check),
+    ("extract", _stage_extract),
+    ("preprocess", _stage_preprocess),
+    ("summarize", _stage_summarize),
+    ("save", _stage_save),
+    ("publish", _stage_publish),
+    ("record", _stage_record),
+]
+_STAGE_INDEX = {name: i for i, (name, _) in enumerate(STAGES)}
+
+def _resumable(index, func):
+    """
+    Skips a stage an earlier run already finished for the job.
+    """
+    def run(job):
+        if index < job.resume_index:
+            return True
+        return func(job)
+    return run
+
+def _finish_job(job):
+    """
+    Releases the job's lease: done (or skipped) jobs are not resumed,
+    failed ones are retried by later runs up to JOB_MAX_ATTEMPTS times.
+    """
+    if job.leased:
+        status = "failed" if job.status == "failed" else "done"
+        database.finish_job(job.video_id, status, job.error, owner=WORKER_ID)
+
+def get_stage_workers(workers=None):
+    """
+    Per-stage worker counts: defaults, then PIPELINE_WORKERS env, then `workers`.
+    """
+    counts = dict(STAGE_WORKERS)
+    env_value = os.getenv("PIPELINE_WORKERS", "")
+    for item in env_value.split(","):
+        if "=" not in item:
+            continue
+        name, value = item.split("=", 1)
+        name = name.strip()
+        if name in counts and value.strip().isdigit():
+            counts[name] = int(value)
+    if workers:
+        counts.update(workers)
+    return counts
 
+def build_pipeline(workers=None, queue_size=None, on_done=None, keep_results=True):
+    """
+    Creates a (not yet started) pipeline for processing videos.
+    """
+    counts = get_stage_workers(workers)
+    if queue_size is None:
+        queue_size = int(os.getenv("PIPELINE_QUEUE_SIZE", DEFAULT_QUEUE_SIZE))
+    stages = [Stage(name, _resumable(i, func), workers=counts[name]) for i, (name, func) in enumerate(STAGES)]
+
+    def finish(job):
+        _finish_job(job)
+        if on_done:
+            on_done(job)
+
+    return Pipeline(stages, queue_size=queue_size, on_done=finish, keep_results=keep_results)
+
+def resume_jobs(max_attempts=None):
+    """
+    VideoJobs for the videos earlier runs left unfinished (crashed, killed
+    or failed), to be submitted again. Each continues at its first
+    incomplete stage.
+    """
+    try:
+        rows = database.unfinished_jobs(max_attempts)
     except Exception as e:
-        print(f"Error saving results: {e}")
-        return False
+        print(f"Error loading unfinished jobs: {e}")
+        return []
+    return [
+        VideoJob(
+            url=row["url"],
+            platform=row["platform"],
+            uploader_name=row["uploader_name"] or "Unknown",
+            title=row["title"],
+            video_id=row["video_id"]
+        )
+        for row in rows
+    ]
+
+def process_videos(jobs, workers=None, queue_size=None):
+    """
+    Processes many VideoJobs through the staged pipeline. Returns the finished jobs.
+    """
+    pipeline = build_pipeline(workers=workers, queue_size=queue_size)
+    return pipeline.run(jobs)
+
+def process_video(url, platform=None, uploader_name="Unknown", title=None, video_id=None, distinct_folder=True):
+    """
+    Main processing logic.
+    distinct_folder: If True, saves to output/[UploaderName]/...
+    """
+    job = VideoJob(
+        url=url,
+        platform=platform,
+        uploader_name=uploader_name,
+        title=title,
+        video_id=video_id,
+        distinct_folder=distinct_folder
+    )
+    process_videos([job])
+    return job.success
@@ -0,0 +1,305 @@
+import os
+import time
+import random
+import threading
+import metrics
+
+# Shared per-upstream request limiter and retry layer.
+#
+# Every upstream ("openai", "notion", "bilibili") has one token bucket shared by
+# all threads and event loops. Its rate starts at the ceiling, is halved when the
+# upstream throttles or fails, and climbs back a little with every success.
+# Retry-After pauses the whole upstream, not just the request that got it.
+# Retries use jittered exponential backoff and are capped per upstream by a
+# retry budget, so an outage does not turn into a flood of retries.
+
+# Max requests per second per upstream. Override with RATE_LIMIT_<NAME>, e.g. RATE_LIMIT_NOTION=2
+DEFAULT_RATES = {
+    "openai": 10.0,
+    "notion": 3.0,
+    "bilibili": 4.0,
+}
+FALLBACK_RATE = 5.0
+# Attempts per request (first try included)
+MAX_ATTEMPTS = int(os.getenv("RETRY_MAX_ATTEMPTS", 4))
+# Backoff: random delay between 0 and min(BACKOFF_CAP, BACKOFF_BASE * 2^attempt) seconds
+BACKOFF_BASE = float(os.getenv("RETRY_BACKOFF_BASE", 1.0))
+BACKOFF_CAP = float(os.getenv("RETRY_BACKOFF_CAP", 30.0))
+# Every request adds this fraction of a retry to the budget; a retry spends one
+RETRY_BUDGET_RATIO = float(os.getenv("RETRY_BUDGET_RATIO", 0.2))
+# Retries always allowed before the ratio kicks in, and the budget's ceiling
+RETRY_BUDGET_MIN = float(os.getenv("RETRY_BUDGET_MIN", 10))
+
+# Throttling or temporary failure. Bilibili answers 412 when it thinks we crawl too fast.
+RETRY_STATUSES = {408, 412, 425, 429, 500, 502, 503, 504}
+# Bilibili API codes inside a 200 response: -412 blocked, -509/-799 too many requests
+RETRY_CODES = {-412, -509, -799}
+# Connection errors raised before anything was sent (urllib3/httpx names,
+# also found in the message of requests' wrapping ConnectionError)
+_NOT_SENT_ERRORS = ("ConnectTimeout", "NewConnectionError", "NameResolutionError", "ConnectError")
+
+class RetryableResponse(Exception):
+    """
+    Raised by a request function to ask for a retry of an otherwise successful
+    call (e.g. a 200 response carrying a throttling code).
+    """
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class AdaptiveLimiter:
+    """
+    Token bucket whose rate adapts to the upstream (AIMD: halve on errors,
+    add a step per success). reserve() never blocks; it returns how long the
+    caller has to wait, so the same limiter works for threads and coroutines.
+    """
+    def __init__(self, name, max_rate, min_rate=None, burst=None):
+        self.name = name
+        self.max_rate = float(max_rate)
+        self.min_rate = float(min_rate or self.max_rate / 20)
+        self.rate = self.max_rate
+        self.burst = float(burst or max(1.0, self.max_rate))
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._last_decrease = 0.0
+        self._budget = RETRY_BUDGET_MIN
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self):
+        """
+        Takes one token. Returns the seconds to wait before sending.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+            self._budget = min(RETRY_BUDGET_MIN, self._budget + RETRY_BUDGET_RATIO)
+            return max(wait, self._paused_until - now)
+
+    def acquire(self):
+        wait = self.reserve()
+        if wait > 0:
+            metrics.observe("rate_limit_wait", wait, api=self.name)
+            time.sleep(wait)
+
+    async def acquire_async(self):
+        import asyncio
+
+        wait = self.reserve()
+        if wait > 0:
+            metrics.observe("rate_limit_wait", wait, api=self.name)
+            await asyncio.sleep(wait)
+
+    def on_success(self):
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.max_rate / 50)
+
+    def on_error(self, retry_after=None):
+        """
+        Slows the upstream down; with retry_after, pauses it for that long.
+        """
+        with self._lock:
+            now = time.monotonic()
+            if retry_after:
+                self._paused_until = max(self._paused_until, now + retry_after)
+            # Errors from requests that were already in flight count once
+            if now - self._last_decrease >= 1.0:
+                self._refill(now)
+                self.rate = max(self.min_rate, self.rate / 2)
+                self._last_decrease = now
+                print(f"{self.name}: throttled, request rate lowered to {self.rate:.2f}/s")
+
+    def take_retry(self):
+        """
+        Spends one retry from the budget. False when the budget is used up.
+        """
+        with self._lock:
+            if self._budget < 1:
+                return False
+            self._budget -= 1
+            return True
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+def get_limiter(name):
+    """
+    Returns the shared limiter for an upstream.
+    """
+    limiter = _limiters.get(name)
+    if limiter is None:
+        with _limiters_lock:
+            limiter = _limiters.get(name)
+            if limiter is None:
+                rate = float(os.getenv(f"RATE_LIMIT_{name.upper()}", DEFAULT_RATES.get(name, FALLBACK_RATE)))
+                limiter = _limiters[name] = AdaptiveLimiter(name, rate)
+    return limiter
+
+def parse_retry_after(value):
+    """
+    Seconds from a Retry-After header (delta seconds or HTTP date), or None.
+    """
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        pass
+    import email.utils
+
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+        return max(0.0, when.timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+def _retry_after(response):
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    # OpenAI also sends the more precise retry-after-ms
+    ms = headers.get("retry-after-ms")
+    if ms:
+        try:
+            return float(ms) / 1000
+        except ValueError:
+            pass
+    return parse_retry_after(headers.get("retry-after"))
+
+def _not_sent(error):
+    """
+    True if the request failed before it was sent, so it cannot have had any effect.
+    """
+    if type(error).__name__ in _NOT_SENT_ERRORS:
+        return True
+    message = str(error)
+    return any(f"{name}(" in message for name in _NOT_SENT_ERRORS)
+
+def classify(result=None, error=None, idempotent=True):
+    """
+    Decides whether a response or exception is worth retrying.
+    Returns (retry, retry_after seconds or None).
+    Requests that must not run twice (idempotent=False, e.g. creating a page)
+    are only retried when the upstream surely did not act on them: throttled
+    (429) or never sent. A timeout or 5xx may come after the work was done.
+    """
+    if not idempotent:
+        response = result if error is None else getattr(error, "response", None)
+        status = getattr(response, "status_code", None) or getattr(error, "status_code", None)
+        if status == 429:
+            return True, _retry_after(response)
+        if isinstance(error, RetryableResponse):
+            return True, error.retry_after
+        return error is not None and status is None and _not_sent(error), None
+
+    if error is None:
+        status = getattr(result, "status_code", None)
+        if status in RETRY_STATUSES:
+            return True, _retry_after(result)
+        return False, None
+
+    if isinstance(error, RetryableResponse):
+        return True, error.retry_after
+
+    # HTTP errors carry a status (openai.APIStatusError, requests/httpx errors with a response)
+    response = getattr(error, "response", None)
+    status = getattr(error, "status_code", None) or getattr(response, "status_code", None)
+    if status is None:
+        # bilibili_api exceptions: NetworkException.status, ResponseCodeException.code
+        status = getattr(error, "status", None)
+        code = getattr(error, "code", None)
+        if isinstance(code, int) and code in RETRY_CODES:
+            return True, None
+    if isinstance(status, int):
+        return status in RETRY_STATUSES, _retry_after(response)
+
+    # No status at all: connection errors and timeouts are retryable
+    name = type(error).__name__
+    if "Timeout" in name or "Connect" in name or isinstance(error, (ConnectionError, TimeoutError)):
+        return True, None
+    return False, None
+
+def backoff_delay(attempt, retry_after=None):
+    """
+    Full-jitter exponential backoff; never shorter than retry_after.
+    """
+    delay = random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+    if retry_after is not None:
+        delay = max(delay, retry_after + random.uniform(0, BACKOFF_BASE / 2))
+    return delay
+
+def _should_retry(limiter, attempt, max_attempts, result=None, error=None, idempotent=True):
+    """
+    Returns the delay before the next attempt, or None to stop.
+    """
+    retry, retry_after = classify(result, error, idempotent)
+    status = type(error).__name__ if error is not None else getattr(result, "status_code", None)
+    if error is not None or (isinstance(status, int) and status >= 400):
+        metrics.incr("api_errors", api=limiter.name, status=status)
+    if not retry:
+        if error is None:
+            limiter.on_success()
+        return None
+
+    limiter.on_error(retry_after)
+    if attempt >= max_attempts:
+        return None
+    if not limiter.take_retry():
+        metrics.incr("retry_budget_exhausted", api=limiter.name)
+        print(f"{limiter.name}: retry budget used up, not retrying.")
+        return None
+
+    metrics.incr("retries", api=limiter.name)
+    delay = backoff_delay(attempt, retry_after)
+    print(f"{limiter.name}: request failed ({status}). Retrying in {delay:.1f}s ({attempt}/{max_attempts})...")
+    return delay
+
+def call(upstream, func, max_attempts=None, idempotent=True):
+    """
+    Calls func() through the upstream's limiter, retrying throttled and failed
+    attempts (see classify for idempotent=False). Returns func's last result;
+    re-raises its last exception.
+    """
+    limiter = get_limiter(upstream)
+    max_attempts = max_attempts or MAX_ATTEMPTS
+    for attempt in range(1, max_attempts + 1):
+        limiter.acquire()
+        try:
+            result = func()
+        except Exception as e:
+            delay = _should_retry(limiter, attempt, max_attempts, error=e, idempotent=idempotent)
+            if delay is None:
+                raise
+        else:
+            delay = _should_retry(limiter, attempt, max_attempts, result=result, idempotent=idempotent)
+            if delay is None:
+                return result
+        time.sleep(delay)
+
+async def call_async(upstream, func, max_attempts=None, idempotent=True):
+    """
+    Like call(), for a func returning an awaitable.
+    """
+    import asyncio
+
+    limiter = get_limiter(upstream)
+    max_attempts = max_attempts or MAX_ATTEMPTS
+    for attempt in range(1, max_attempts + 1):
+        await limiter.acquire_async()
+        try:
+            result = await func()
+        except Exception as e:
+            delay = _should_retry(limiter, attempt, max_attempts, error=e, idempotent=idempotent)
+            if delay is None:
+                raise
+        else:
+            delay = _should_retry(limiter, attempt, max_attempts, result=result, idempotent=idempotent)
+            if delay is None:
+                return result
+        await asyncio.sleep(delay)
@@ -1,24 +1,290 @@
 import os
-from openai import OpenAI
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+import summary_cache
+import metrics
+import ratelimit
+from transcript import Transcript, as_text
+from clients import get_openai_client
 
-def summarize(text):
+MODEL = "gpt-4o" # Using a capable model
+
+SYSTEM_PROMPT = "You are a specialized financial analyst assistant. Your goal is to extract stock market information, ticker symbols, and financial analysis from video transcripts. You must output your summary in Chinese."
+
+USER_PROMPT_TEMPLATE = "Please summarize the following transcript in Chinese. \n\nFocus on:\n1. Key stock tickers mentioned.\n2. Market sentiment (Bullish/Bearish).\n3. Key financial data or events.\n4. Actionable investment advice implications.\n\nTranscript:\n{text}"
+
+# Long transcripts: every chunk is condensed into notes ("map"), then the notes
+# are merged into the usual summary format ("reduce").
+MAP_PROMPT_TEMPLATE = "This is part {index} of {total} of a long video transcript. Write detailed notes in Chinese for this part only. \n\nKeep:\n1. Every stock ticker mentioned, with context.\n2. Market sentiment (Bullish/Bearish) and the reasons given.\n3. Key financial data, numbers or events.\n4. Any investment advice.\n\nTranscript part:\n{text}"
+
+REDUCE_PROMPT_TEMPLATE = "The following are notes on consecutive parts of one video transcript. Merge them into a single summary in Chinese. Remove repetition and keep all distinct facts. \n\nFocus on:\n1. Key stock tickers mentioned.\n2. Market sentiment (Bullish/Bearish).\n3. Key financial data or events.\n4. Actionable investment advice implications.\n\nNotes:\n{text}"
+
+# Transcripts longer than this many tokens are summarized with map-reduce
+CHUNK_TOKENS = int(os.getenv("SUMMARY_CHUNK_TOKENS", 12000))
+# Number of chunk ("map") requests sent at the same time
+MAP_WORKERS = int(os.getenv("SUMMARY_MAP_WORKERS", 4))
+# Attempts per request before giving up
+MAX_RETRIES = int(os.getenv("SUMMARY_MAX_RETRIES", ratelimit.MAX_ATTEMPTS))
+
+_encoding = None
+
+def _get_encoding():
     """
-    Summarizes the given text using OpenAI API.
+    Returns the tiktoken encoding for MODEL, or None if tiktoken is not usable.
     """
-    api_key = os.getenv("OPENAI_API_KEY")
-    if not api_key:
-        raise ValueError("OPENAI_API_KEY not found in environment variables. Please create a .env file with your key.")
-    
-    client = OpenAI(api_key=api_key)
-    
-    try:
-        response = client.chat.completions.create(
-            model="gpt-4o", # Using a capable model
+    global _encoding
+    if _encoding is None:
+        try:
+            import tiktoken
+            try:
+                _encoding = tiktoken.encoding_for_model(MODEL)
+            except KeyError:
+                _encoding = tiktoken.get_encoding("o200k_base")
+        except Exception as e:
+            # Not installed, or the encoding file could not be downloaded (offline)
+            if not isinstance(e, ImportError):
+                print(f"tiktoken unavailable ({e}). Estimating token counts.")
+            _encoding = False
+    return _encoding or None
+
+def count_tokens(text):
+    """
+    Counts tokens with tiktoken. Without tiktoken, estimates:
+    one token per CJK character, one per 4 other characters.
+    """
+    encoding = _get_encoding()
+    if encoding:
+        return len(encoding.encode(text, disallowed_special=()))
+    cjk = len(re.findall(r'[\u3000-\u9fff\uff00-\uffef]', text))
+    return cjk + (len(text) - cjk) // 4 + 1
+
+def split_into_chunks(text, chunk_tokens=None):
+    """
+    Splits text into chunks of at most chunk_tokens tokens, cutting at
+    sentence ends or whitespace where possible. A timed Transcript is cut
+    between its segments instead.
+    """
+    chunk_tokens = chunk_tokens or CHUNK_TOKENS
+    if count_tokens(as_text(text)) <= chunk_tokens:
+        return [as_text(text)]
+
+    if isinstance(text, Transcript):
+        if not text.timed:
+            return split_into_chunks(text.text, chunk_tokens)
+        chunks = []
+        for chunk in text.chunks(chunk_tokens, count_tokens):
+            # Only splits further if one segment alone is over the limit
+            chunks.extend(split_into_chunks(chunk.text, chunk_tokens))
+        return chunks
+
+    chunks = []
+    current = []
+    current_tokens = 0
+    for piece in re.split(r'(?<=[。！？!?.\s])', text):
+        if not piece:
+            continue
+        piece_tokens = count_tokens(piece)
+
+        if piece_tokens > chunk_tokens:
+            # A single run without any break (e.g. unpunctuated Chinese), cut it by size
+            step = max(1, len(piece) * chunk_tokens // piece_tokens)
+            sub_pieces = [piece[i:i+step] for i in range(0, len(piece), step)]
+        else:
+            sub_pieces = [piece]
+
+        for sub in sub_pieces:
+            sub_tokens = piece_tokens if len(sub_pieces) == 1 else count_tokens(sub)
+            if current and current_tokens + sub_tokens > chunk_tokens:
+                chunks.append("".join(current))
+                current = []
+                current_tokens = 0
+            current.append(sub)
+            current_tokens += sub_tokens
+
+    if current:
+        chunks.append("".join(current))
+    return chunks
+
+def _complete(client, prompt, max_retries=None):
+    """
+    Sends one chat completion through the shared OpenAI rate limiter, retrying
+    throttled and failed attempts. Raises after the last attempt.
+    """
+    def create():
+        with metrics.timer("openai_chat"):
+            return client.chat.completions.create(
+                model=MODEL,
+                messages=[
+                    {"role": "system", "content": SYSTEM_PROMPT},
+                    {"role": "user", "content": prompt}
+                ]
+            )
+
+    response = ratelimit.call("openai", create, max_attempts=max_retries or MAX_RETRIES)
+    usage = getattr(response, "usage", None)
+    if usage:
+        metrics.incr("openai_tokens", usage.prompt_tokens or 0, model=MODEL, direction="sent")
+        metrics.incr("openai_tokens", usage.completion_tokens or 0, model=MODEL, direction="received")
+    return response.choices[0].message.content
+
+def _complete_stream(client, prompt, max_retries=None):
+    """
+    Like _complete, but yields the completion in pieces as they arrive.
+    Only opening the stream is retried; a stream that breaks off raises.
+    """
+    def create():
+        return client.chat.completions.create(
+            model=MODEL,
             messages=[
-                {"role": "system", "content": "You are a specialized financial analyst assistant. Your goal is to extract stock market information, ticker symbols, and financial analysis from video transcripts. You must output your summary in Chinese."},
-                {"role": "user", "content": f"Please summarize the following transcript in Chinese. \n\nFocus on:\n1. Key stock tickers mentioned.\n2. Market sentiment (Bullish/Bearish).\n3. Key financial data or events.\n4. Actionable investment advice implications.\n\nTranscript:\n{text}"}
-            ]
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": prompt}
+            ],
+            stream=True,
+            stream_options={"include_usage": True}
         )
-        return response.choices[0].message.content
+
+    start = time.perf_counter()
+    stream = ratelimit.call("openai", create, max_attempts=max_retries or MAX_RETRIES)
+    first = True
+    try:
+        for chunk in stream:
+            usage = getattr(chunk, "usage", None)
+            if usage:
+                metrics.incr("openai_tokens", usage.prompt_tokens or 0, model=MODEL, direction="sent")
+                metrics.incr("openai_tokens", usage.completion_tokens or 0, model=MODEL, direction="received")
+            if not chunk.choices:
+                continue
+            content = chunk.choices[0].delta.content
+            if content:
+                if first:
+                    metrics.observe("openai_first_token", time.perf_counter() - start)
+                    first = False
+                yield content
+    finally:
+        stream.close()
+        metrics.observe("openai_chat", time.perf_counter() - start)
+
+def _final_prompt(client, text, chunk_tokens=None, max_workers=None):
+    """
+    The prompt whose completion is the summary. For long transcripts the
+    chunk notes ("map") are collected first and merged by this prompt.
+    """
+    chunks = split_into_chunks(text, chunk_tokens)
+    if len(chunks) == 1:
+        return USER_PROMPT_TEMPLATE.format(text=chunks[0])
+
+    total = len(chunks)
+    print(f"Long transcript, summarizing in {total} chunks...")
+
+    def map_chunk(item):
+        index, chunk = item
+        notes = _complete(client, MAP_PROMPT_TEMPLATE.format(index=index, total=total, text=chunk))
+        print(f"Chunk {index}/{total} summarized.")
+        return notes
+
+    with ThreadPoolExecutor(max_workers=max_workers or MAP_WORKERS) as pool:
+        notes = list(pool.map(map_chunk, enumerate(chunks, 1)))
+
+    merged_notes = "\n\n".join(f"Part {i}:\n{n}" for i, n in enumerate(notes, 1))
+    return REDUCE_PROMPT_TEMPLATE.format(text=merged_notes)
+
+def _summarize_uncached(client, text, chunk_tokens=None, max_workers=None):
+    """
+    Runs the summary requests. Raises on failure.
+    """
+    return _complete(client, _final_prompt(client, text, chunk_tokens, max_workers))
+
+def get_cache_key(text, chunk_tokens=None):
+    """
+    Summary cache key for text with the current prompts, model and chunk size.
+    """
+    return summary_cache.make_key(
+        text,
+        MODEL,
+        SYSTEM_PROMPT,
+        USER_PROMPT_TEMPLATE,
+        MAP_PROMPT_TEMPLATE,
+        REDUCE_PROMPT_TEMPLATE,
+        chunk_tokens or CHUNK_TOKENS
+    )
+
+def summarize(text, chunk_tokens=None, max_workers=None):
+    """
+    Summarizes the given text (a string or Transcript) using OpenAI API.
+    Long transcripts are split into chunks that are summarized in parallel and then merged.
+    Results are cached, so re-running the same transcript costs no API call.
+    """
+    cache_key = get_cache_key(as_text(text), chunk_tokens)
+    cached = summary_cache.get_summary(cache_key)
+    if cached:
+        print("Summary cache hit.")
+        return cached
+
+    client = _get_client()
+
+    try:
+        summary = _summarize_uncached(client, text, chunk_tokens, max_workers)
     except Exception as e:
         return f"Error during summarization: {e}"
+
+    summary_cache.put_summary(cache_key, MODEL, summary)
+    return summary
+
+def _get_client():
+    api_key = os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        raise ValueError("OPENAI_API_KEY not found in environment variables. Please create a .env file with your key.")
+    return get_openai_client(api_key)
+
+def summarize_stream(text, chunk_tokens=None, max_workers=None):
+    """
+    Like summarize(), but yields the summary in pieces as the model writes
+    it. For long transcripts only the final merge is streamed. A cached
+    summary is yielded whole. Raises on failure instead of returning error
+    text; the summary is cached once it is complete.
+    """
+    cache_key = get_cache_key(as_text(text), chunk_tokens)
+    cached = summary_cache.get_summary(cache_key)
+    if cached:
+        print("Summary cache hit.")
+        yield cached
+        return
+
+    client = _get_client()
+    prompt = _final_prompt(client, text, chunk_tokens, max_workers)
+    pieces = []
+    for piece in _complete_stream(client, prompt):
+        pieces.append(piece)
+        yield piece
+
+    summary_cache.put_summary(cache_key, MODEL, "".join(pieces))
+
+def summarize_to_file(text, path, header="", on_text=None, chunk_tokens=None, max_workers=None):
+    """
+    Streams the summary into path after header, calling on_text(piece) for
+    every piece. It is written to a unique <path>.<pid>.<id>.part file next
+    to path (follow it with tail -f) and renamed to path once complete, so
+    path never holds half a summary, even when two jobs share a file name.
+    Returns the summary.
+    """
+    import uuid
+    part_path = f"{path}.{os.getpid()}.{uuid.uuid4().hex[:8]}.part"
+    pieces = []
+    try:
+        with open(part_path, "w", encoding="utf-8") as f:
+            f.write(header)
+            for piece in summarize_stream(text, chunk_tokens, max_workers):
+                pieces.append(piece)
+                f.write(piece)
+                f.flush()
+                if on_text:
+                    on_text(piece)
+        os.replace(part_path, path)
+    except BaseException:
+        try:
+            os.remove(part_path)
+        except OSError:
+            pass
+        raise
+    return "".join(pieces)
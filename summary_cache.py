@@ -0,0 +1,91 @@
+import os
+import re
+import time
+import zlib
+import sqlite3
+import hashlib
+import threading
+import metrics
+
+# Finished summaries, keyed by a hash of everything that decides the output:
+# the normalized transcript, the prompts and the model name.
+CACHE_PATH = os.getenv("SUMMARY_CACHE_PATH", "summary_cache.db")
+
+_lock = threading.Lock()
+_conn = None
+
+def _get_connection():
+    global _conn
+    if _conn is None:
+        directory = os.path.dirname(CACHE_PATH)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(CACHE_PATH, timeout=30, check_same_thread=False)
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS summaries (
+                cache_key TEXT PRIMARY KEY,
+                model TEXT,
+                summary BLOB,
+                created INTEGER,
+                last_access REAL
+            )
+        ''')
+        conn.commit()
+        _conn = conn
+    return _conn
+
+def normalize_transcript(text):
+    """
+    Collapses whitespace so formatting-only differences map to the same key.
+    """
+    return re.sub(r'\s+', ' ', text).strip()
+
+def make_key(text, model, *prompts):
+    """
+    Hashes the normalized transcript, the model name and every prompt template.
+    """
+    h = hashlib.sha256()
+    for part in (model, *prompts, normalize_transcript(text)):
+        data = str(part).encode("utf-8")
+        # Length prefix keeps ("ab", "c") and ("a", "bc") apart
+        h.update(len(data).to_bytes(8, "big"))
+        h.update(data)
+    return h.hexdigest()
+
+def get_summary(key):
+    """
+    Returns the cached summary for key, or None.
+    """
+    try:
+        with _lock:
+            conn = _get_connection()
+            row = conn.execute("SELECT summary FROM summaries WHERE cache_key = ?", (key,)).fetchone()
+            if not row:
+                metrics.incr("cache_misses", cache="summary")
+                return None
+            conn.execute("UPDATE summaries SET last_access = ? WHERE cache_key = ?", (time.time(), key))
+            conn.commit()
+        metrics.incr("cache_hits", cache="summary")
+        return zlib.decompress(row[0]).decode("utf-8")
+    except Exception as e:
+        print(f"Error reading summary cache: {e}")
+        return None
+
+def put_summary(key, model, summary):
+    """
+    Stores a finished summary. Only call this with real summaries, never error text.
+    """
+    if not summary:
+        return
+    try:
+        data = zlib.compress(summary.encode("utf-8"), 6)
+        now = time.time()
+        with _lock:
+            conn = _get_connection()
+            conn.execute('''
+                INSERT OR REPLACE INTO summaries (cache_key, model, summary, created, last_access)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (key, model, data, int(now), now))
+            conn.commit()
+    except Exception as e:
+        print(f"Error writing summary cache: {e}")
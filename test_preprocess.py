@@ -0,0 +1,44 @@
+from preprocess import clean_text, dedupe_segments
+
+def test_tickers_kept():
+    text = "I bought Apple (AAPL) and Tesla (TSLA) today, 特斯拉（TSLA）涨了5% (year over year)"
+    cleaned = clean_text(text)
+    assert "(AAPL)" in cleaned
+    assert "(TSLA)" in cleaned
+    assert "（TSLA）" in cleaned
+    assert "(year over year)" in cleaned
+
+def test_sound_tags_removed():
+    assert clean_text("[Music] hello (upbeat music) world [音乐] 好(笑) [Applause]") == "hello world 好"
+
+def test_letters_within_words_kept():
+    assert clean_text("Buy BBBY and AAA-rated bonds") == "Buy BBBY and AAA-rated bonds"
+    assert clean_text("shares of MMM fell") == "shares of MMM fell"
+    assert clean_text("see www.example.com") == "see www.example.com"
+
+def test_repeated_words_collapsed():
+    assert clean_text("the market, the market, the market is up") == "the market is up"
+    assert clean_text("我们我们我们今天") == "我们今天"
+
+def test_spoken_times_kept():
+    assert clean_text("10:30 the fed meets") == "10:30 the fed meets"
+    assert clean_text("00:01:02,000 --> 00:01:05,500 the fed meets") == "the fed meets"
+    assert clean_text("[01:02] the fed meets") == "the fed meets"
+
+def test_sequential_segments_kept():
+    segments = [(0, 2, "今天的市场"), (2, 4, "市场非常好 英伟达涨了"), (4, 6, "涨了百分之五")]
+    assert [s[2] for s in dedupe_segments(segments)] == ["今天的市场", "市场非常好 英伟达涨了", "涨了百分之五"]
+
+def test_rolling_captions_trimmed():
+    segments = [(0, 4, "the market is up"), (2, 6, "market is up today on"), (4, 8, "today on strong earnings")]
+    assert [s[2] for s in dedupe_segments(segments)] == ["the market is up", "today on", "strong earnings"]
+
+if __name__ == "__main__":
+    test_tickers_kept()
+    test_sound_tags_removed()
+    test_letters_within_words_kept()
+    test_repeated_words_collapsed()
+    test_spoken_times_kept()
+    test_sequential_segments_kept()
+    test_rolling_captions_trimmed()
+    print("OK")
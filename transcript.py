@@ -0,0 +1,184 @@
+import sys
+import struct
+from array import array
+
+# Separator between segments in Transcript.text
+SEPARATOR = " "
+
+_MAGIC = b"YTR1"
+_HEADER = struct.Struct("<4sIB")
+
+class Transcript:
+    """
+    A transcript as timed segments, stored compactly: segment start and end
+    times (seconds) in float arrays, the text of every segment in one string
+    joined by SEPARATOR, and an offsets array indexing each segment's start
+    in that string (plus one final entry past the end).
+
+    `text` is the same string the extractors used to build by joining
+    segments, so code that only needs text can keep using it. Transcripts
+    without timing (plain text, old cache entries) hold one untimed segment.
+    """
+    __slots__ = ("text", "starts", "ends", "offsets", "timed")
+
+    def __init__(self, text, starts, ends, offsets, timed=True):
+        self.text = text
+        self.starts = starts
+        self.ends = ends
+        self.offsets = offsets
+        self.timed = timed
+
+    @classmethod
+    def from_segments(cls, segments):
+        """
+        Builds a transcript from (start, end, text) tuples in time order.
+        Empty segments are dropped.
+        """
+        starts = array("f")
+        ends = array("f")
+        offsets = array("I")
+        pieces = []
+        position = 0
+        for start, end, text in segments:
+            text = " ".join(str(text).split())
+            if not text:
+                continue
+            starts.append(start)
+            ends.append(end)
+            offsets.append(position)
+            pieces.append(text)
+            position += len(text) + len(SEPARATOR)
+        offsets.append(position)
+        return cls(SEPARATOR.join(pieces), starts, ends, offsets)
+
+    @classmethod
+    def from_text(cls, text):
+        """
+        An untimed transcript holding text as a single segment.
+        """
+        transcript = cls.from_segments([(0.0, 0.0, text)])
+        transcript.timed = False
+        return transcript
+
+    @classmethod
+    def concat(cls, parts):
+        """
+        Joins transcripts in order. Untimed parts make the result untimed.
+        """
+        parts = [p for p in parts if p]
+        result = cls.from_segments(segment for part in parts for segment in part)
+        result.timed = all(p.timed for p in parts)
+        return result
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __bool__(self):
+        return bool(self.text)
+
+    def __str__(self):
+        return self.text
+
+    def __iter__(self):
+        for i in range(len(self.starts)):
+            yield self.starts[i], self.ends[i], self.segment_text(i)
+
+    def segment_text(self, index):
+        return self.text[self.offsets[index]:self.offsets[index + 1] - len(SEPARATOR)]
+
+    @property
+    def duration(self):
+        return self.ends[-1] if self.timed and len(self.ends) else 0.0
+
+    def shift(self, seconds):
+        """
+        A copy with every time moved by seconds (e.g. the start of an audio segment).
+        """
+        starts = array("f", (s + seconds for s in self.starts))
+        ends = array("f", (e + seconds for e in self.ends))
+        return Transcript(self.text, starts, ends, array("I", self.offsets), self.timed)
+
+    def map_times(self, func):
+        """
+        A copy with every start and end time t replaced by func(t).
+        """
+        starts = array("f", (func(s) for s in self.starts))
+        ends = array("f", (func(e) for e in self.ends))
+        return Transcript(self.text, starts, ends, array("I", self.offsets), self.timed)
+
+    def between(self, start=None, end=None):
+        """
+        The segments that start in [start, end). Either bound may be None.
+        """
+        return Transcript.from_segments(
+            (s, e, text) for s, e, text in self
+            if (start is None or s >= start) and (end is None or s < end)
+        )
+
+    def chunks(self, max_tokens, count_tokens):
+        """
+        Splits into consecutive transcripts of at most max_tokens tokens, cutting
+        only between segments (a single longer segment becomes its own chunk).
+        """
+        chunks = []
+        current = []
+        current_tokens = 0
+        for segment in self:
+            tokens = count_tokens(segment[2])
+            if current and current_tokens + tokens > max_tokens:
+                chunks.append(Transcript.from_segments(current))
+                current = []
+                current_tokens = 0
+            current.append(segment)
+            current_tokens += tokens
+        if current:
+            chunks.append(Transcript.from_segments(current))
+        for chunk in chunks:
+            chunk.timed = self.timed
+        return chunks
+
+    def to_bytes(self):
+        """
+        Compact binary form: header, the three arrays, then the UTF-8 text.
+        """
+        starts = array("f", self.starts)
+        ends = array("f", self.ends)
+        offsets = array("I", self.offsets)
+        if sys.byteorder == "big":
+            # Always stored little-endian
+            for a in (starts, ends, offsets):
+                a.byteswap()
+        return b"".join([
+            _HEADER.pack(_MAGIC, len(starts), int(self.timed)),
+            starts.tobytes(),
+            ends.tobytes(),
+            offsets.tobytes(),
+            self.text.encode("utf-8"),
+        ])
+
+    @classmethod
+    def from_bytes(cls, data):
+        """
+        Reverses to_bytes. Plain UTF-8 text (older cache entries) becomes an untimed transcript.
+        """
+        if not data.startswith(_MAGIC):
+            return cls.from_text(data.decode("utf-8"))
+        _, count, timed = _HEADER.unpack_from(data)
+        position = _HEADER.size
+        arrays = []
+        for typecode, length in (("f", count), ("f", count), ("I", count + 1)):
+            a = array(typecode)
+            size = a.itemsize * length
+            a.frombytes(data[position:position + size])
+            position += size
+            arrays.append(a)
+        if sys.byteorder == "big":
+            for a in arrays:
+                a.byteswap()
+        return cls(data[position:].decode("utf-8"), *arrays, timed=bool(timed))
+
+def as_text(transcript):
+    """
+    Text of a Transcript or a plain string.
+    """
+    return transcript.text if isinstance(transcript, Transcript) else transcript
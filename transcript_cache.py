@@ -0,0 +1,171 @@
+import os
+import time
+import zlib
+import sqlite3
+import hashlib
+import threading
+import metrics
+from transcript import Transcript
+
+# Transcripts are stored zlib-compressed (Transcript.to_bytes) under objects/,
+# named by the SHA-256 of that data, and indexed by (platform, video_id, source)
+# in index.db.
+CACHE_DIR = os.getenv("TRANSCRIPT_CACHE_DIR", "transcript_cache")
+# Total size of the compressed objects before least recently used entries are evicted
+MAX_BYTES = int(os.getenv("TRANSCRIPT_CACHE_MAX_BYTES", 200 * 1024 * 1024))
+
+SOURCES = ("subtitle", "whisper")
+
+_lock = threading.Lock()
+_conn = None
+
+def _get_connection():
+    global _conn
+    if _conn is None:
+        os.makedirs(os.path.join(CACHE_DIR, "objects"), exist_ok=True)
+        conn = sqlite3.connect(os.path.join(CACHE_DIR, "index.db"), timeout=30, check_same_thread=False)
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS entries (
+                platform TEXT,
+                video_id TEXT,
+                source TEXT,
+                digest TEXT,
+                created INTEGER,
+                last_access REAL,
+                PRIMARY KEY (platform, video_id, source)
+            )
+        ''')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS objects (
+                digest TEXT PRIMARY KEY,
+                size INTEGER
+            )
+        ''')
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_last_access ON entries (last_access)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_digest ON entries (digest)")
+        conn.commit()
+        _conn = conn
+    return _conn
+
+def _object_path(digest):
+    return os.path.join(CACHE_DIR, "objects", digest[:2], digest + ".zz")
+
+def get_transcript(platform, video_id, source=None):
+    """
+    Returns the cached Transcript, or None.
+    With source=None, a subtitle transcript is preferred over a Whisper one.
+    """
+    if not video_id:
+        return None
+    sources = [source] if source else list(SOURCES)
+
+    try:
+        with _lock:
+            conn = _get_connection()
+            for src in sources:
+                row = conn.execute(
+                    "SELECT digest FROM entries WHERE platform = ? AND video_id = ? AND source = ?",
+                    (platform, video_id, src)
+                ).fetchone()
+                if not row:
+                    continue
+
+                path = _object_path(row[0])
+                if not os.path.exists(path):
+                    # Object was removed behind our back, forget the entry
+                    conn.execute(
+                        "DELETE FROM entries WHERE platform = ? AND video_id = ? AND source = ?",
+                        (platform, video_id, src)
+                    )
+                    conn.commit()
+                    continue
+
+                with open(path, "rb") as f:
+                    transcript = Transcript.from_bytes(zlib.decompress(f.read()))
+                conn.execute(
+                    "UPDATE entries SET last_access = ? WHERE platform = ? AND video_id = ? AND source = ?",
+                    (time.time(), platform, video_id, src)
+                )
+                conn.commit()
+                print(f"Transcript cache hit: {platform}/{video_id} ({src})")
+                metrics.incr("cache_hits", cache="transcript")
+                return transcript
+    except Exception as e:
+        print(f"Error reading transcript cache: {e}")
+    metrics.incr("cache_misses", cache="transcript")
+    return None
+
+def put_transcript(platform, video_id, source, transcript):
+    """
+    Stores a Transcript (or plain text) and evicts old entries if the cache
+    is over MAX_BYTES.
+    """
+    if not video_id or not transcript:
+        return
+    if source not in SOURCES:
+        raise ValueError(f"Unknown transcript source: {source}")
+
+    if not isinstance(transcript, Transcript):
+        transcript = Transcript.from_text(transcript)
+    data = transcript.to_bytes()
+    digest = hashlib.sha256(data).hexdigest()
+    path = _object_path(digest)
+
+    try:
+        with _lock:
+            conn = _get_connection()
+            if not os.path.exists(path):
+                compressed = zlib.compress(data, 6)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                tmp_path = f"{path}.{os.getpid()}.tmp"
+                with open(tmp_path, "wb") as f:
+                    f.write(compressed)
+                os.replace(tmp_path, path)
+                conn.execute(
+                    "INSERT OR REPLACE INTO objects (digest, size) VALUES (?, ?)",
+                    (digest, len(compressed))
+                )
+
+            now = time.time()
+            conn.execute('''
+                INSERT OR REPLACE INTO entries (platform, video_id, source, digest, created, last_access)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (platform, video_id, source, digest, int(now), now))
+            conn.commit()
+            _evict(conn)
+    except Exception as e:
+        print(f"Error writing transcript cache: {e}")
+
+def _evict(conn, max_bytes=None):
+    """
+    Drops least recently used entries until the stored objects fit in max_bytes.
+    """
+    max_bytes = MAX_BYTES if max_bytes is None else max_bytes
+    total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM objects").fetchone()[0]
+    if total <= max_bytes:
+        return
+
+    rows = conn.execute(
+        "SELECT platform, video_id, source, digest FROM entries ORDER BY last_access"
+    ).fetchall()
+    for platform, video_id, source, digest in rows:
+        if total <= max_bytes:
+            break
+        conn.execute(
+            "DELETE FROM entries WHERE platform = ? AND video_id = ? AND source = ?",
+            (platform, video_id, source)
+        )
+        # Objects are shared by identical transcripts, only drop unreferenced ones
+        still_used = conn.execute("SELECT 1 FROM entries WHERE digest = ? LIMIT 1", (digest,)).fetchone()
+        if still_used:
+            continue
+        size = conn.execute("SELECT size FROM objects WHERE digest = ?", (digest,)).fetchone()
+        conn.execute("DELETE FROM objects WHERE digest = ?", (digest,))
+        try:
+            os.remove(_object_path(digest))
+        except OSError:
+            pass
+        if size:
+            total -= size[0]
+    conn.commit()
+    print(f"Transcript cache trimmed to {total / (1024*1024):.1f} MB")